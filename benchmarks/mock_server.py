@@ -0,0 +1,237 @@
+"""Local stand-in for the EMT MobilityLabs API used by the benchmarks."""
+
+from __future__ import annotations
+
+import asyncio
+from collections import Counter
+from datetime import datetime
+import random
+from typing import Any
+
+from aiohttp import web
+
+ENDPOINT_LOGIN = "login"
+ENDPOINT_DETAIL = "detail"
+ENDPOINT_ARRIVES = "arrives"
+ENDPOINT_ARROUNDSTOP = "arroundstop"
+ENDPOINT_STATIONS = "stations"
+ENDPOINT_STATION = "station"
+
+# Rough centre of Madrid, where the fake stops and stations are spread around.
+_CENTER = (-3.7038, 40.4168)
+
+
+def _response(data: list[dict[str, Any]], code: str = "00") -> dict[str, Any]:
+    """Wrap data the way every MobilityLabs response does."""
+    return {
+        "code": code,
+        "description": "Data recovered OK",
+        "datetime": datetime.now().isoformat(),
+        "data": data,
+    }
+
+
+def _coordinates(seed: int) -> list[float]:
+    """Return stable coordinates near the centre of Madrid for an ID."""
+    rng = random.Random(seed)
+    return [_CENTER[0] + rng.uniform(-0.05, 0.05), _CENTER[1] + rng.uniform(-0.05, 0.05)]
+
+
+class MockMobilityLabs:
+    """Serve fake MobilityLabs responses with configurable latency and errors."""
+
+    def __init__(
+        self,
+        lines_per_stop: int = 3,
+        stations: int = 250,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int | None = None,
+    ) -> None:
+        """Initialize the server."""
+        self.lines_per_stop = lines_per_stop
+        self.stations = stations
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.requests: Counter[str] = Counter()
+        self.errors: Counter[str] = Counter()
+        self._random = random.Random(seed)
+        self._runner: web.AppRunner | None = None
+
+        app = web.Application()
+        app.router.add_route("*", "/v3/mobilitylabs/user/login/", self._login)
+        app.router.add_route(
+            "*",
+            "/v3/transport/busemtmad/stops/arroundstop/{stop}/{radius}/",
+            self._arroundstop,
+        )
+        app.router.add_route(
+            "*", "/v3/transport/busemtmad/stops/{stop}/detail/", self._detail
+        )
+        app.router.add_route(
+            "*", "/v3/transport/busemtmad/stops/{stop}/arrives/", self._arrives
+        )
+        app.router.add_route("*", "/v3/transport/bicimad/stations/", self._stations)
+        app.router.add_route(
+            "*", "/v3/transport/bicimad/stations/{station}", self._station
+        )
+        self._app = app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start serving and return the base URL of the server."""
+        self._runner = web.AppRunner(self._app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        _, bound_port = self._runner.addresses[0][:2]
+        return f"http://{host}:{bound_port}/"
+
+    async def stop(self) -> None:
+        """Stop serving."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def reset_counters(self) -> None:
+        """Forget the requests served so far."""
+        self.requests.clear()
+        self.errors.clear()
+
+    def line_labels(self) -> list[str]:
+        """Return the labels of the lines serving every stop."""
+        return [str(line) for line in range(1, self.lines_per_stop + 1)]
+
+    async def _serve(self, endpoint: str, data: list[dict[str, Any]]) -> web.Response:
+        """Count the request, then answer it after the latency, or with an error."""
+        self.requests[endpoint] += 1
+        delay = self.latency + self._random.uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        if self._random.random() < self.error_rate:
+            self.errors[endpoint] += 1
+            raise web.HTTPInternalServerError()
+        return web.json_response(_response(data, "01" if endpoint == ENDPOINT_LOGIN else "00"))
+
+    async def _login(self, request: web.Request) -> web.Response:
+        """Log any user in."""
+        return await self._serve(
+            ENDPOINT_LOGIN,
+            [
+                {
+                    "accessToken": "benchmark-token",
+                    "email": request.headers.get("email"),
+                    "tokenSecExpiration": 86400,
+                    "apiCounter": {"current": 0, "dailyUse": 20000},
+                }
+            ],
+        )
+
+    async def _detail(self, request: web.Request) -> web.Response:
+        """Describe a stop served by every line."""
+        stop = request.match_info["stop"]
+        lines = [
+            {
+                "line": label.zfill(3),
+                "label": label,
+                "direction": "A",
+                "maxFreq": "20",
+                "minFreq": "8",
+                "headerA": f"TERMINAL {label}A",
+                "headerB": f"TERMINAL {label}B",
+                "startTime": "00:00",
+                "stopTime": "23:59",
+                "dayType": "LA",
+            }
+            for label in self.line_labels()
+        ]
+        return await self._serve(
+            ENDPOINT_DETAIL,
+            [
+                {
+                    "stops": [
+                        {
+                            "stop": stop,
+                            "name": f"Stop {stop}",
+                            "postalAddress": f"Calle {stop}",
+                            "geometry": {
+                                "type": "Point",
+                                "coordinates": _coordinates(int(stop)),
+                            },
+                            "dataLine": lines,
+                        }
+                    ]
+                }
+            ],
+        )
+
+    async def _arroundstop(self, request: web.Request) -> web.Response:
+        """Describe a stop in the shorter format of the stops around it."""
+        stop = request.match_info["stop"]
+        return await self._serve(
+            ENDPOINT_ARROUNDSTOP,
+            [
+                {
+                    "stopId": stop,
+                    "stopName": f"Stop {stop}",
+                    "address": f"Calle {stop}",
+                    "geometry": {
+                        "type": "Point",
+                        "coordinates": _coordinates(int(stop)),
+                    },
+                    "lines": [
+                        {
+                            "label": label,
+                            "to": "A",
+                            "nameA": f"TERMINAL {label}A",
+                            "nameB": f"TERMINAL {label}B",
+                        }
+                        for label in self.line_labels()
+                    ],
+                }
+            ],
+        )
+
+    async def _arrives(self, request: web.Request) -> web.Response:
+        """Return two buses of every line on their way to a stop."""
+        stop = request.match_info["stop"]
+        arrivals = [
+            {
+                "line": label,
+                "stop": stop,
+                "destination": f"TERMINAL {label}A",
+                "estimateArrive": self._random.randint(0, 1800),
+                "DistanceBus": self._random.randint(0, 5000),
+            }
+            for label in self.line_labels()
+            for _ in range(2)
+        ]
+        return await self._serve(
+            ENDPOINT_ARRIVES,
+            [{"Arrive": arrivals, "StopInfo": [], "ExtraInfo": [], "Incident": {}}],
+        )
+
+    def _station_data(self, station_id: int) -> dict[str, Any]:
+        """Return the data of a BiciMad station."""
+        return {
+            "id": str(station_id),
+            "number": str(station_id),
+            "name": f"Station {station_id}",
+            "address": f"Calle {station_id}",
+            "geometry": {"type": "Point", "coordinates": _coordinates(station_id)},
+            "dock_bikes": self._random.randint(0, 24),
+            "free_bases": self._random.randint(0, 24),
+        }
+
+    async def _stations(self, request: web.Request) -> web.Response:
+        """Return every BiciMad station."""
+        return await self._serve(
+            ENDPOINT_STATIONS,
+            [self._station_data(station) for station in range(1, self.stations + 1)],
+        )
+
+    async def _station(self, request: web.Request) -> web.Response:
+        """Return a single BiciMad station."""
+        station = int(request.match_info["station"])
+        return await self._serve(ENDPOINT_STATION, [self._station_data(station)])
@@ -0,0 +1,263 @@
+"""Benchmark the EMT Madrid integration against a local mock MobilityLabs server.
+
+Run from the repository root, for example::
+
+    python -m benchmarks.run --stops 50 --lines 4 --stations 20 --latency 0.05
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+from dataclasses import asdict, dataclass, field
+import json
+import logging
+from pathlib import Path
+import resource
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from homeassistant.config_entries import ConfigEntryState
+from homeassistant.const import CONF_EMAIL, CONF_PASSWORD
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.loader import DATA_CUSTOM_COMPONENTS
+from pytest_homeassistant_custom_component.common import (
+    MockConfigEntry,
+    async_test_home_assistant,
+)
+
+from custom_components.emt_madrid.const import (
+    CONF_LINES,
+    CONF_SENSOR_TYPE,
+    CONF_STATION_ID,
+    CONF_STOP_ID,
+    DATA_BICIMAD_COORDINATORS,
+    DATA_FETCH_ENGINE,
+    DATA_TOKEN_MANAGERS,
+    DOMAIN,
+    SENSOR_TYPE_BICIMAD,
+    SENSOR_TYPE_BUS,
+)
+from custom_components.emt_madrid.emt_madrid import APIEMT, TokenManager
+
+from .mock_server import MockMobilityLabs
+
+EMAIL = "benchmark@mail.com"
+PASSWORD = "benchmark"
+FIRST_STOP_ID = 1000
+CUSTOM_COMPONENTS = Path(__file__).resolve().parent.parent / "custom_components"
+
+
+@dataclass
+class BenchmarkResult:
+    """Numbers measured by a benchmark run."""
+
+    stops: int
+    lines: int
+    stations: int
+    entries_loaded: int
+    setup_seconds: float
+    setup_requests: dict[str, int]
+    cycle_ms: dict[str, float]
+    cycle_requests: dict[str, int]
+    cycle_errors: dict[str, int]
+    calls_per_hour: float
+    max_rss_kib: int
+    traced_kib: dict[str, float] = field(default_factory=dict)
+
+
+def _percentiles(samples: list[float]) -> dict[str, float]:
+    """Summarize durations in milliseconds."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    return {
+        "min": round(ordered[0] * 1000, 2),
+        "median": round(statistics.median(ordered) * 1000, 2),
+        "p95": round(ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)] * 1000, 2),
+        "max": round(ordered[-1] * 1000, 2),
+    }
+
+
+def _entries(stops: int, lines: list[str], stations: int) -> list[MockConfigEntry]:
+    """Return a config entry per bus stop and per BiciMad station."""
+    credentials = {CONF_EMAIL: EMAIL, CONF_PASSWORD: PASSWORD}
+    entries = [
+        MockConfigEntry(
+            domain=DOMAIN,
+            data={
+                **credentials,
+                CONF_SENSOR_TYPE: SENSOR_TYPE_BUS,
+                CONF_STOP_ID: FIRST_STOP_ID + stop,
+                CONF_LINES: lines,
+            },
+        )
+        for stop in range(stops)
+    ]
+    entries.extend(
+        MockConfigEntry(
+            domain=DOMAIN,
+            data={
+                **credentials,
+                CONF_SENSOR_TYPE: SENSOR_TYPE_BICIMAD,
+                CONF_STATION_ID: station,
+            },
+        )
+        for station in range(1, stations + 1)
+    )
+    return entries
+
+
+async def async_run_benchmark(args: argparse.Namespace) -> BenchmarkResult:
+    """Set up the integration against the mock server and poll it."""
+    server = MockMobilityLabs(
+        lines_per_stop=args.lines,
+        stations=max(args.stations, args.network_size),
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    base_url = await server.start()
+    traced: dict[str, float] = {}
+    if args.trace_memory:
+        tracemalloc.start()
+
+    with tempfile.TemporaryDirectory() as config_dir:
+        # Let Home Assistant load the integration from this repository.
+        (Path(config_dir) / "custom_components").symlink_to(CUSTOM_COMPONENTS)
+        async with async_test_home_assistant(storage_dir=config_dir) as hass:
+            hass.data.pop(DATA_CUSTOM_COMPONENTS)
+            # Every client of the account talks to the server of its token manager.
+            token_manager = TokenManager(
+                APIEMT(async_get_clientsession(hass), EMAIL, PASSWORD, base_url=base_url)
+            )
+            hass.data.setdefault(DOMAIN, {}).setdefault(DATA_TOKEN_MANAGERS, {})[
+                EMAIL
+            ] = token_manager
+
+            entries = _entries(args.stops, server.line_labels(), args.stations)
+            for entry in entries:
+                entry.add_to_hass(hass)
+
+            start = time.perf_counter()
+            await asyncio.gather(
+                *(hass.config_entries.async_setup(entry.entry_id) for entry in entries)
+            )
+            await hass.async_block_till_done()
+            setup_seconds = time.perf_counter() - start
+            setup_requests = dict(server.requests)
+            if args.trace_memory:
+                traced["after_setup"] = round(tracemalloc.get_traced_memory()[0] / 1024, 1)
+
+            domain_data = hass.data[DOMAIN]
+            engine = domain_data.get(DATA_FETCH_ENGINE)
+            bus_coordinators = list(engine._coordinators) if engine is not None else []
+            bicimad_coordinators = list(
+                domain_data.get(DATA_BICIMAD_COORDINATORS, {}).values()
+            )
+
+            server.reset_counters()
+            durations: list[float] = []
+            for _ in range(args.cycles):
+                # Make every stop due and every response old, as if the polling
+                # interval had passed.
+                for coordinator in bus_coordinators:
+                    coordinator.next_refresh = hass.loop.time()
+                token_manager.coalescer._results.clear()
+                start = time.perf_counter()
+                await asyncio.gather(
+                    *([engine._async_run_cycle()] if engine is not None else []),
+                    *(coordinator.async_refresh() for coordinator in bicimad_coordinators),
+                )
+                durations.append(time.perf_counter() - start)
+
+            coordinators = [*bus_coordinators, *bicimad_coordinators]
+            refreshes = args.cycles * len(coordinators)
+            requests_per_refresh = (
+                sum(server.requests.values()) / refreshes if refreshes else 0
+            )
+            calls_per_hour = requests_per_refresh * sum(
+                3600 / coordinator.update_interval.total_seconds()
+                for coordinator in coordinators
+                if coordinator.update_interval
+            )
+
+            if args.trace_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                traced["after_cycles"] = round(current / 1024, 1)
+                traced["peak"] = round(peak / 1024, 1)
+                tracemalloc.stop()
+
+            entries_loaded = sum(
+                entry.state is ConfigEntryState.LOADED for entry in entries
+            )
+            await hass.async_stop(force=True)
+
+    await server.stop()
+    return BenchmarkResult(
+        stops=args.stops,
+        lines=args.lines,
+        stations=args.stations,
+        entries_loaded=entries_loaded,
+        setup_seconds=round(setup_seconds, 3),
+        setup_requests=setup_requests,
+        cycle_ms=_percentiles(durations),
+        cycle_requests=dict(server.requests),
+        cycle_errors=dict(server.errors),
+        calls_per_hour=round(calls_per_hour, 1),
+        max_rss_kib=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        traced_kib=traced,
+    )
+
+
+def _print_result(result: BenchmarkResult) -> None:
+    """Print the numbers of a run in a readable form."""
+    print(
+        f"{result.stops} stops x {result.lines} lines, {result.stations} stations "
+        f"({result.entries_loaded} entries loaded)"
+    )
+    print(f"  setup:          {result.setup_seconds:.3f} s, requests {result.setup_requests}")
+    print(f"  refresh cycle:  {result.cycle_ms} ms")
+    print(f"  cycle requests: {result.cycle_requests}, errors {result.cycle_errors}")
+    print(f"  API calls/hour: {result.calls_per_hour:.0f} (projected)")
+    print(f"  max RSS:        {result.max_rss_kib} KiB")
+    if result.traced_kib:
+        print(f"  traced memory:  {result.traced_kib} KiB")
+
+
+def main() -> None:
+    """Run a benchmark from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stops", type=int, default=20, help="bus stops to set up")
+    parser.add_argument("--lines", type=int, default=3, help="lines serving each stop")
+    parser.add_argument("--stations", type=int, default=10, help="BiciMad stations to set up")
+    parser.add_argument(
+        "--network-size", type=int, default=600, help="stations in the BiciMad network"
+    )
+    parser.add_argument("--cycles", type=int, default=10, help="refresh cycles to time")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random latency")
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="fraction of requests that fail"
+    )
+    parser.add_argument("--seed", type=int, default=None, help="seed of the mock data")
+    parser.add_argument(
+        "--trace-memory", action="store_true", help="trace Python allocations (slower)"
+    )
+    parser.add_argument("--json", action="store_true", help="print the result as JSON")
+    parser.add_argument("--verbose", action="store_true", help="show the integration logs")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.CRITICAL)
+    result = asyncio.run(async_run_benchmark(args))
+    if args.json:
+        print(json.dumps(asdict(result), indent=2))
+    else:
+        _print_result(result)
+
+
+if __name__ == "__main__":
+    main()
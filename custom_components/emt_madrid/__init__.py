@@ -6,33 +6,156 @@ import logging
 
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import Platform
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.typing import ConfigType
 
-from .const import DOMAIN
+from .bicimad import BicimadEMT
+from .cache import EMTStationCatalog, EMTStopCache, EMTStopCatalog
+from .const import (
+    DATA_BICIMAD_COORDINATORS,
+    DATA_ENTRY_COORDINATORS,
+    DATA_FETCH_ENGINE,
+    DATA_STATION_CATALOG,
+    DATA_STOP_CACHE,
+    DATA_STOP_CATALOG,
+    DATA_TOKEN_MANAGERS,
+    DOMAIN,
+)
+from .coordinator import EMTBicimadCoordinator, EMTCoordinator
+from .emt_madrid import APIEMT, TokenManager
+from .engine import EMTFetchEngine
 
 _LOGGER = logging.getLogger(__name__)
 
 PLATFORMS: list[Platform] = [Platform.SENSOR]
 
+CONFIG_SCHEMA = cv.config_entry_only_config_schema(DOMAIN)
+
+
+async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
+    """Set up the EMT Madrid services."""
+    # The services use the catalogue getters of this module.
+    from .services import async_setup_services  # pylint: disable=import-outside-toplevel
+
+    async_setup_services(hass)
+    return True
+
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up EMT Madrid from a config entry."""
     hass.data.setdefault(DOMAIN, {})
     hass.data[DOMAIN][entry.entry_id] = entry.data
+    entry.async_on_unload(entry.add_update_listener(async_reload_entry))
 
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
     return True
 
 
+@callback
+def async_get_token_manager(
+    hass: HomeAssistant, email: str, password: str
+) -> TokenManager:
+    """Return the token manager shared by every entry of an account."""
+    managers: dict[str, TokenManager] = hass.data.setdefault(DOMAIN, {}).setdefault(
+        DATA_TOKEN_MANAGERS, {}
+    )
+    manager = managers.get(email)
+    if manager is None or not manager.api.has_credentials(email, password):
+        manager = TokenManager(APIEMT(async_get_clientsession(hass), email, password))
+        managers[email] = manager
+    return manager
+
+
+@callback
+def async_get_stop_cache(hass: HomeAssistant) -> EMTStopCache:
+    """Return the on-disk cache of bus stop details."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    if DATA_STOP_CACHE not in domain_data:
+        domain_data[DATA_STOP_CACHE] = EMTStopCache(hass)
+    return domain_data[DATA_STOP_CACHE]
+
+
+@callback
+def async_get_station_catalog(hass: HomeAssistant) -> EMTStationCatalog:
+    """Return the cached catalogue of BiciMad stations."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    if DATA_STATION_CATALOG not in domain_data:
+        domain_data[DATA_STATION_CATALOG] = EMTStationCatalog(hass)
+    return domain_data[DATA_STATION_CATALOG]
+
+
+@callback
+def async_get_stop_catalog(hass: HomeAssistant) -> EMTStopCatalog:
+    """Return the cached catalogue of every bus stop."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    if DATA_STOP_CATALOG not in domain_data:
+        domain_data[DATA_STOP_CATALOG] = EMTStopCatalog(hass)
+    return domain_data[DATA_STOP_CATALOG]
+
+
+@callback
+def async_get_fetch_engine(hass: HomeAssistant) -> EMTFetchEngine:
+    """Return the engine that polls every bus stop of the integration."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    if DATA_FETCH_ENGINE not in domain_data:
+        domain_data[DATA_FETCH_ENGINE] = EMTFetchEngine(hass)
+    return domain_data[DATA_FETCH_ENGINE]
+
+
+@callback
+def async_get_bicimad_coordinator(
+    hass: HomeAssistant, email: str, password: str
+) -> EMTBicimadCoordinator:
+    """Return the BiciMad coordinator shared by every station of an account."""
+    coordinators: dict[str, EMTBicimadCoordinator] = hass.data.setdefault(
+        DOMAIN, {}
+    ).setdefault(DATA_BICIMAD_COORDINATORS, {})
+    token_manager = async_get_token_manager(hass, email, password)
+    coordinator = coordinators.get(email)
+    if coordinator is None or coordinator.bicimad_emt.token_manager is not token_manager:
+        coordinator = EMTBicimadCoordinator(
+            hass,
+            BicimadEMT(
+                async_get_clientsession(hass),
+                email,
+                password,
+                token_manager=token_manager,
+            ),
+        )
+        coordinators[email] = coordinator
+    return coordinator
+
+
+@callback
+def async_set_entry_coordinator(
+    hass: HomeAssistant, entry: ConfigEntry, coordinator: EMTCoordinator
+) -> None:
+    """Remember the coordinator that polls the data of an entry."""
+    hass.data.setdefault(DOMAIN, {}).setdefault(DATA_ENTRY_COORDINATORS, {})[
+        entry.entry_id
+    ] = coordinator
+
+
+@callback
+def async_get_entry_coordinator(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> EMTCoordinator | None:
+    """Return the coordinator that polls the data of an entry, if it is set up."""
+    coordinators = hass.data.get(DOMAIN, {}).get(DATA_ENTRY_COORDINATORS, {})
+    return coordinators.get(entry.entry_id)
+
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
     unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
     if unload_ok:
         hass.data[DOMAIN].pop(entry.entry_id)
+        hass.data[DOMAIN].get(DATA_ENTRY_COORDINATORS, {}).pop(entry.entry_id, None)
     return unload_ok
 
 
 async def async_reload_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
     """Reload config entry."""
-    await async_unload_entry(hass, entry)
-    await async_setup_entry(hass, entry)
+    await hass.config_entries.async_reload(entry.entry_id)
@@ -0,0 +1,74 @@
+"""Circuit breaker for the EMT Madrid API."""
+
+from __future__ import annotations
+
+import random
+import time
+from typing import Any
+
+FAILURE_THRESHOLD = 3
+BASE_BACKOFF = 30
+MAX_BACKOFF = 30 * 60
+
+
+class CircuitBreaker:
+    """Stop sending requests to a failing host, trying again with a growing delay."""
+
+    def __init__(self) -> None:
+        """Initialize the breaker closed."""
+        self._failures = 0
+        self._trips = 0
+        self._retry_at: float | None = None
+        self._trial_in_flight = False
+
+    @property
+    def is_open(self) -> bool:
+        """Return whether requests are currently being held back."""
+        return self._retry_at is not None
+
+    def allow_request(self) -> bool:
+        """Return whether a request may be sent now."""
+        if self._retry_at is None:
+            return True
+        if self._trial_in_flight or time.monotonic() < self._retry_at:
+            return False
+        # Let a single request through to find out if the host has recovered.
+        self._trial_in_flight = True
+        return True
+
+    def retry_in(self) -> float | None:
+        """Return the seconds until the next request is let through, if open."""
+        if self._retry_at is None:
+            return None
+        return max(self._retry_at - time.monotonic(), 0)
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the state of the breaker in a JSON serializable form."""
+        retry_in = self.retry_in()
+        return {
+            "open": self.is_open,
+            "consecutive_failures": self._failures,
+            "retry_in_seconds": round(retry_in, 1) if retry_in is not None else None,
+        }
+
+    def record_success(self) -> None:
+        """Close the breaker after a successful request."""
+        self._failures = 0
+        self._trips = 0
+        self._retry_at = None
+        self._trial_in_flight = False
+
+    def record_cancelled(self) -> None:
+        """Let another trial request through after one was cancelled."""
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        """Count a failed request, opening the breaker once there are too many."""
+        self._failures += 1
+        self._trial_in_flight = False
+        if self._retry_at is None and self._failures < FAILURE_THRESHOLD:
+            return
+        backoff = min(BASE_BACKOFF * 2**self._trips, MAX_BACKOFF)
+        self._trips += 1
+        # Jitter keeps the clients of every account from retrying in lockstep.
+        self._retry_at = time.monotonic() + backoff * random.uniform(0.5, 1)
@@ -1,53 +1,77 @@
 """Bus-related API client for EMT Madrid."""
 
-import math
-
-from .emt_madrid import BASE_URL, APIEMT, _LOGGER
+import time
+from types import MappingProxyType
+
+import aiohttp
+
+from .emt_madrid import APIEMT, TokenManager, _LOGGER
+from .models import (
+    NO_ARRIVALS,
+    Arrival,
+    Line,
+    LineArrivals,
+    Stop,
+    StopArrivals,
+    parse_coordinates,
+    to_minutes,
+)
 
 ENDPOINT_ARRIVAL_TIME = "v3/transport/busemtmad/stops/"
 ENDPOINT_STOP_INFO = "v3/transport/busemtmad/stops/"
 ENDPOINT_STOPS_AROUND_STOP = "v3/transport/busemtmad/stops/arroundstop/"
 
+# estimateArrive value used by the API when a bus has no estimated arrival.
+NO_ESTIMATE = 999999
+
+UNKNOWN_LINE = Line()
+
 
 class BusesEMT(APIEMT):
     """API client for EMT bus stop information and arrival times."""
 
-    def __init__(self, user: str, password: str, stop_id: int) -> None:
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        user: str,
+        password: str,
+        stop_id: int,
+        token_manager: TokenManager | None = None,
+    ) -> None:
         """Initialize the BusesEMT instance."""
-        super().__init__(user, password)
-        self._stop_info: dict = {
-            "bus_stop_id": stop_id,
-            "bus_stop_name": None,
-            "bus_stop_coordinates": None,
-            "bus_stop_address": None,
-            "lines": {},
-        }
-
-    def update_stop_info(self, stop_id: int) -> None:
+        super().__init__(session, user, password, token_manager)
+        self._stop = Stop(stop_id)
+        self._arrivals = StopArrivals()
+
+    async def update_stop_info(self, stop_id: int) -> None:
         """Update all the lines and information from the bus stop."""
-        url = f"{BASE_URL}{ENDPOINT_STOP_INFO}{stop_id}/detail/"
-        headers = {"accessToken": self._token}
+        url = f"{self.base_url}{ENDPOINT_STOP_INFO}{stop_id}/detail/"
         data = {"idStop": stop_id}
-        if self._token is not None:
-            response = self._make_request(url, headers=headers, data=data, method="GET")
-            self._parse_stop_info(response)
-
-    def retry_update_stop_info(self) -> dict | None:
+        response = await self._make_authenticated_request(url, data=data, method="GET")
+        if response is not None:
+            retry_response = None
+            if response.get("code") == "81":
+                self._record_retry("stop_info_fallback")
+                retry_response = await self.retry_update_stop_info()
+            with self._time_parse("stop_info"):
+                self._parse_stop_info(response, retry_response)
+
+    async def retry_update_stop_info(self) -> dict | None:
         """Retry updating stop info via arroundstop endpoint."""
-        stop_id = self._stop_info["bus_stop_id"]
-        url = f"{BASE_URL}{ENDPOINT_STOPS_AROUND_STOP}{stop_id}/0/"
-        headers = {"accessToken": self._token}
+        stop_id = self._stop.stop_id
+        url = f"{self.base_url}{ENDPOINT_STOPS_AROUND_STOP}{stop_id}/0/"
         data = {"idStop": stop_id}
-        if self._token is not None:
-            response = self._make_request(url, headers=headers, data=data, method="GET")
-            return response
-        return None
+        return await self._make_authenticated_request(url, data=data, method="GET")
 
-    def get_stop_info(self) -> dict:
+    def get_stop_info(self) -> Stop:
         """Retrieve all the information from the bus stop."""
-        return self._stop_info
+        return self._stop
+
+    def restore_stop_info(self, stop: Stop) -> None:
+        """Restore previously stored stop information, keeping current arrivals."""
+        self._stop = stop
 
-    def _parse_stop_info(self, response: dict) -> None:
+    def _parse_stop_info(self, response: dict, retry_response: dict | None = None) -> None:
         """Parse the stop info from the API response."""
         try:
             response_code = response.get("code")
@@ -58,105 +82,96 @@ class BusesEMT(APIEMT):
             elif response_code == "98":
                 _LOGGER.warning("API limit reached")
             elif response_code == "81":
-                retry_response = self.retry_update_stop_info()
                 if retry_response is None:
                     return
 
                 stop_info = retry_response["data"][0]
-                self._stop_info.update(
-                    {
-                        "bus_stop_name": stop_info["stopName"],
-                        "bus_stop_coordinates": stop_info["geometry"]["coordinates"],
-                        "bus_stop_address": stop_info["address"],
-                        "lines": self._parse_lines(stop_info["lines"], "basic"),
-                    }
+                self._stop = Stop(
+                    stop_id=self._stop.stop_id,
+                    name=stop_info["stopName"],
+                    coordinates=parse_coordinates(stop_info["geometry"]["coordinates"]),
+                    address=stop_info["address"],
+                    lines=self._parse_lines(stop_info["lines"], "basic"),
                 )
             else:
                 stop_info = response["data"][0]["stops"][0]
-                self._stop_info.update(
-                    {
-                        "bus_stop_name": stop_info["name"],
-                        "bus_stop_coordinates": stop_info["geometry"]["coordinates"],
-                        "bus_stop_address": stop_info["postalAddress"],
-                        "lines": self._parse_lines(stop_info["dataLine"], "full"),
-                    }
+                self._stop = Stop(
+                    stop_id=self._stop.stop_id,
+                    name=stop_info["name"],
+                    coordinates=parse_coordinates(stop_info["geometry"]["coordinates"]),
+                    address=stop_info["postalAddress"],
+                    lines=self._parse_lines(stop_info["dataLine"], "full"),
                 )
         except (KeyError, IndexError) as e:
             raise ValueError("Unable to get bus stop information") from e
 
-    def _parse_lines(self, lines: list, mode: str) -> dict:
+    def _parse_lines(self, lines: list, mode: str) -> MappingProxyType[str, Line]:
         """Parse the line info from the API response."""
+        line_info: dict[str, Line] = {}
         if mode == "full":
-            line_info = {}
             for line in lines:
                 line_number = line["label"]
                 direction = line.get("direction", "A")
-                line_info[line_number] = {
-                    "destination": line["headerA"] if direction == "A" else line["headerB"],
-                    "origin": line["headerA"] if direction == "B" else line["headerB"],
-                    "max_freq": int(line.get("maxFreq", 0)),
-                    "min_freq": int(line.get("minFreq", 0)),
-                    "start_time": line.get("startTime"),
-                    "end_time": line.get("stopTime"),
-                    "day_type": line.get("dayType"),
-                    "distance": [],
-                    "arrivals": [],
-                }
+                line_info[line_number] = Line(
+                    destination=line["headerA"] if direction == "A" else line["headerB"],
+                    origin=line["headerA"] if direction == "B" else line["headerB"],
+                    max_freq=int(line.get("maxFreq", 0)),
+                    min_freq=int(line.get("minFreq", 0)),
+                    start_time=line.get("startTime"),
+                    end_time=line.get("stopTime"),
+                    day_type=line.get("dayType"),
+                )
         elif mode == "basic":
-            line_info = {}
             for line in lines:
                 line_number = line["label"]
                 to_dir = line.get("to", "A")
-                line_info[line_number] = {
-                    "destination": line["nameA"] if to_dir == "A" else line["nameB"],
-                    "origin": line["nameA"] if to_dir == "B" else line["nameB"],
-                    "distance": [],
-                    "arrivals": [],
-                }
-        return line_info
+                line_info[line_number] = Line(
+                    destination=line["nameA"] if to_dir == "A" else line["nameB"],
+                    origin=line["nameA"] if to_dir == "B" else line["nameB"],
+                )
+        return MappingProxyType(line_info)
 
-    def update_arrival_times(self, stop: int) -> None:
+    async def update_arrival_times(self, stop: int) -> None:
         """Update the arrival times for the specified bus stop and line."""
-        url = f"{BASE_URL}{ENDPOINT_ARRIVAL_TIME}{stop}/arrives/"
-        headers = {"accessToken": self._token}
+        url = f"{self.base_url}{ENDPOINT_ARRIVAL_TIME}{stop}/arrives/"
         data = {"stopId": stop, "Text_EstimationsRequired_YN": "Y"}
-        if self._token is not None:
-            response = self._make_request(
-                url, headers=headers, data=data, method="POST"
-            )
-            self._parse_arrivals(response)
+        response = await self._make_authenticated_request(url, data=data, method="POST")
+        if response is not None:
+            with self._time_parse("arrivals"):
+                self._parse_arrivals(response)
+
+    def get_arrivals(self) -> StopArrivals:
+        """Retrieve the latest arrivals of every line at the stop."""
+        return self._arrivals
 
-    def get_arrival_time(self, line: str) -> list[int | None]:
+    def get_line_arrivals(self, line: str) -> LineArrivals:
+        """Retrieve the buses of a line on their way to the stop."""
+        return self._arrivals.lines.get(line, NO_ARRIVALS)
+
+    def get_arrival_time(self, line: str) -> tuple[int | None, int | None]:
         """Retrieve arrival times in minutes for the specified bus line."""
-        try:
-            arrivals = self._stop_info["lines"][line].get("arrivals", [])
-        except KeyError:
-            return [None, None]
-        while len(arrivals) < 2:
-            arrivals.append(None)
-        return arrivals[:2]
-
-    def get_line_info(self, line: str) -> dict:
+        return self.get_line_arrivals(line).minutes
+
+    def get_arrival_countdown(self, line: str) -> tuple[int | None, int | None]:
+        """Retrieve arrival times in seconds, counted down since the last update."""
+        estimates = self.get_line_arrivals(line).estimates
+        updated_at = self._arrivals.updated_at
+        if updated_at is None:
+            return estimates
+        elapsed = int(time.monotonic() - updated_at)
+        first, second = estimates
+        return (
+            max(first - elapsed, 0) if first is not None else None,
+            max(second - elapsed, 0) if second is not None else None,
+        )
+
+    def get_line_info(self, line: str) -> Line:
         """Retrieve the information for a specific line."""
-        lines = self._stop_info["lines"]
-        if line in lines:
-            line_info = dict(lines.get(line, {}))
-            if "distance" in line_info and len(line_info.get("distance", [])) == 0:
-                line_info["distance"].append(None)
-            return line_info
-
-        _LOGGER.warning("The bus line %s does not exist at this stop.", line)
-        return {
-            "destination": None,
-            "origin": None,
-            "max_freq": None,
-            "min_freq": None,
-            "start_time": None,
-            "end_time": None,
-            "day_type": None,
-            "distance": [None],
-            "arrivals": [None, None],
-        }
+        line_info = self._stop.lines.get(line)
+        if line_info is None:
+            _LOGGER.warning("The bus line %s does not exist at this stop.", line)
+            return UNKNOWN_LINE
+        return line_info
 
     def _parse_arrivals(self, response: dict) -> None:
         """Parse the arrival times and distance from the API response."""
@@ -164,19 +179,43 @@ class BusesEMT(APIEMT):
             if response.get("code") == "80":
                 _LOGGER.warning("Bus Stop disabled or does not exist")
             else:
-                for line_info in self._stop_info["lines"].values():
-                    line_info["arrivals"] = []
-                    line_info["distance"] = []
-                arrivals = response["data"][0].get("Arrive", [])
-                for arrival in arrivals:
-                    line = arrival.get("line")
-                    line_info = self._stop_info["lines"].get(line)
-                    if line_info:
-                        estimate = arrival.get("estimateArrive", 0)
-                        arrival_time = min(math.trunc(estimate / 60), 45)
-                        line_info["arrivals"].append(arrival_time)
-                        line_info["distance"].append(arrival.get("DistanceBus"))
+                lines: dict[str, list[Arrival]] = {line: [] for line in self._stop.lines}
+                for arrival in response["data"][0].get("Arrive", []):
+                    line_arrivals = lines.get(arrival.get("line"))
+                    if line_arrivals is not None:
+                        estimate = arrival.get("estimateArrive")
+                        if estimate is None or estimate >= NO_ESTIMATE:
+                            estimate = None
+                        line_arrivals.append(
+                            Arrival(estimate=estimate, distance=arrival.get("DistanceBus"))
+                        )
+                self._arrivals = StopArrivals(
+                    lines=MappingProxyType(
+                        {
+                            line: self._line_arrivals(arrivals)
+                            for line, arrivals in lines.items()
+                        }
+                    ),
+                    updated_at=time.monotonic(),
+                )
         except (KeyError, IndexError) as e:
             raise ValueError("Unable to get the arrival times from the API") from e
         except TypeError as e:
             _LOGGER.error("ERROR %s --> RESPONSE: %s", e, response)
+
+    @staticmethod
+    def _line_arrivals(arrivals: list[Arrival]) -> LineArrivals:
+        """Precompute what the sensors read from the arrivals of a line."""
+        if not arrivals:
+            return NO_ARRIVALS
+        padded = (*arrivals[:2], None, None)[:2]
+        estimates = tuple(
+            arrival.estimate if arrival is not None else None for arrival in padded
+        )
+        return LineArrivals(
+            arrivals=tuple(arrivals),
+            estimates=estimates,
+            minutes=to_minutes(estimates),
+            distance=arrivals[0].distance,
+            has_estimate=arrivals[0].estimate is not None,
+        )
@@ -0,0 +1,234 @@
+"""Persistent caches for EMT Madrid integration."""
+
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+import asyncio
+from datetime import timedelta
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
+
+from .const import DOMAIN
+from .emt_madrid import APIEMT
+from .spatial import GridIndex
+
+STORAGE_VERSION = 1
+STORAGE_KEY_STOPS = f"{DOMAIN}.stops"
+STORAGE_KEY_STATIONS = f"{DOMAIN}.bicimad_stations"
+STORAGE_KEY_STOP_CATALOG = f"{DOMAIN}.bus_stops"
+STORAGE_SAVE_DELAY = 10
+
+STOP_INFO_TTL = timedelta(days=7)
+STATION_CATALOG_TTL = timedelta(days=1)
+STOP_CATALOG_TTL = timedelta(days=7)
+
+
+class EMTStopCache:
+    """Keep the static details of bus stops on disk between restarts."""
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        """Initialize the cache."""
+        self._store: Store[dict[str, dict[str, Any]]] = Store(
+            hass, STORAGE_VERSION, STORAGE_KEY_STOPS
+        )
+        self._stops: dict[str, dict[str, Any]] | None = None
+        self._load_lock = asyncio.Lock()
+        self.hits = 0
+        self.expired = 0
+        self.misses = 0
+
+    async def async_get(self, stop_id: int) -> tuple[dict | None, bool]:
+        """Return the cached details of a stop and whether they have expired."""
+        await self._async_load()
+        cached = self._stops.get(str(stop_id))
+        if cached is None:
+            self.misses += 1
+            return None, True
+        age = dt_util.utcnow().timestamp() - cached["fetched_at"]
+        expired = age > STOP_INFO_TTL.total_seconds()
+        if expired:
+            self.expired += 1
+        else:
+            self.hits += 1
+        return cached["stop_info"], expired
+
+    def stats(self) -> dict[str, Any]:
+        """Return how often the cached stop details could be used."""
+        lookups = self.hits + self.expired + self.misses
+        return {
+            "stops": len(self._stops) if self._stops is not None else None,
+            "hits": self.hits,
+            "expired": self.expired,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+        }
+
+    async def async_set(self, stop_id: int, stop_info: dict) -> None:
+        """Store freshly fetched details of a stop."""
+        await self._async_load()
+        self._stops[str(stop_id)] = {
+            "fetched_at": dt_util.utcnow().timestamp(),
+            "stop_info": stop_info,
+        }
+        self._store.async_delay_save(lambda: self._stops, STORAGE_SAVE_DELAY)
+
+    async def _async_load(self) -> None:
+        """Load the stored stops the first time they are needed."""
+        async with self._load_lock:
+            if self._stops is None:
+                self._stops = await self._store.async_load() or {}
+
+
+class EMTCatalog(ABC):
+    """Keep a list fetched in bulk from the API indexed, in memory and on disk."""
+
+    _ttl: timedelta
+    _items_key: str
+
+    def __init__(self, hass: HomeAssistant, storage_key: str) -> None:
+        """Initialize the catalogue."""
+        self._store: Store[dict[str, Any]] = Store(hass, STORAGE_VERSION, storage_key)
+        self._fetched_at: float | None = None
+        self._items: list[dict] = []
+        self.index: GridIndex[dict] = GridIndex([])
+        self._loaded = False
+        self._lock = asyncio.Lock()
+        self.hits = 0
+        self.fetches = 0
+
+    async def async_update(self, api: APIEMT) -> None:
+        """Fetch the items unless the catalogue is still fresh."""
+        async with self._lock:
+            if not self._loaded:
+                self._loaded = True
+                if stored := await self._store.async_load():
+                    self._set_items(stored[self._items_key], stored["fetched_at"])
+            if not self._is_expired():
+                self.hits += 1
+                return
+            self.fetches += 1
+            items = await self._async_fetch(api)
+            if not items:
+                return
+            self._set_items(items, dt_util.utcnow().timestamp())
+            self._store.async_delay_save(
+                lambda: {"fetched_at": self._fetched_at, self._items_key: self._items},
+                STORAGE_SAVE_DELAY,
+            )
+
+    def stats(self) -> dict[str, Any]:
+        """Return how often the catalogue could be used without fetching it."""
+        lookups = self.hits + self.fetches
+        return {
+            self._items_key: len(self._items),
+            "age_seconds": (
+                round(dt_util.utcnow().timestamp() - self._fetched_at)
+                if self._fetched_at is not None
+                else None
+            ),
+            "hits": self.hits,
+            "fetches": self.fetches,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+        }
+
+    @abstractmethod
+    async def _async_fetch(self, api: APIEMT) -> list[dict] | None:
+        """Fetch every item from the API, in the form kept on disk."""
+
+    def _set_items(self, items: list[dict], fetched_at: float) -> None:
+        """Sort the items and rebuild the spatial index."""
+        self._fetched_at = fetched_at
+        self._items = sorted(items, key=lambda item: item["id"])
+        # Coordinates come from the API as longitude, latitude.
+        self.index = GridIndex(
+            (item["coordinates"][1], item["coordinates"][0], item)
+            for item in self._items
+            if item.get("coordinates")
+        )
+
+    def _is_expired(self) -> bool:
+        """Return whether the catalogue has to be fetched again."""
+        return (
+            self._fetched_at is None
+            or dt_util.utcnow().timestamp() - self._fetched_at > self._ttl.total_seconds()
+        )
+
+
+class EMTStationCatalog(EMTCatalog):
+    """Keep the list of BiciMad stations sorted and indexed, in memory and on disk."""
+
+    _ttl = STATION_CATALOG_TTL
+    _items_key = "stations"
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        """Initialize the catalogue."""
+        super().__init__(hass, STORAGE_KEY_STATIONS)
+        self._options: dict[int, str] = {}
+
+    async def async_get_options(self, api: APIEMT) -> dict[int, str]:
+        """Return the station labels for a dropdown, sorted by station ID."""
+        await self.async_update(api)
+        return self._options
+
+    async def _async_fetch(self, api: APIEMT) -> list[dict] | None:
+        """Fetch every BiciMad station."""
+        stations = await api.get_all_bicimad_stations()
+        if not stations:
+            return None
+        return [
+            {
+                "id": int(station["id"]),
+                "number": station.get("number"),
+                "name": station.get("name"),
+                "address": station.get("address"),
+                "coordinates": station.get("geometry", {}).get("coordinates"),
+            }
+            for station in stations
+            if "id" in station
+        ]
+
+    def _set_items(self, items: list[dict], fetched_at: float) -> None:
+        """Sort the stations and rebuild the spatial index and dropdown labels."""
+        super()._set_items(items, fetched_at)
+        self._options = {
+            station["id"]: (
+                f"{station.get('number') or '?'} - {station.get('name') or 'Unknown'}"
+            )
+            for station in self._items
+        }
+
+
+class EMTStopCatalog(EMTCatalog):
+    """Keep the list of every bus stop sorted and indexed, in memory and on disk."""
+
+    _ttl = STOP_CATALOG_TTL
+    _items_key = "stops"
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        """Initialize the catalogue."""
+        super().__init__(hass, STORAGE_KEY_STOP_CATALOG)
+
+    async def _async_fetch(self, api: APIEMT) -> list[dict] | None:
+        """Fetch every bus stop of the network."""
+        stops = await api.get_all_bus_stops()
+        if not stops:
+            return None
+        catalog = []
+        for stop in stops:
+            stop_id = stop.get("node", stop.get("stop"))
+            try:
+                stop_id = int(stop_id)
+            except (TypeError, ValueError):
+                continue
+            catalog.append(
+                {
+                    "id": stop_id,
+                    "name": stop.get("name"),
+                    "coordinates": stop.get("geometry", {}).get("coordinates"),
+                    "lines": stop.get("lines", []),
+                }
+            )
+        return catalog
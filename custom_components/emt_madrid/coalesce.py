@@ -0,0 +1,70 @@
+"""Coalescing of identical EMT Madrid API requests."""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+import time
+from typing import Any
+
+# Seconds a response is reused for identical requests made after it arrived.
+RESULT_CACHE_TTL = 5
+
+# MobilityLabs codes of the responses worth reusing.
+SUCCESS_CODES = ("00", "01")
+
+
+class RequestCoalescer:
+    """Send identical requests once and share the response with every caller."""
+
+    def __init__(self) -> None:
+        """Initialize the coalescer."""
+        self._in_flight: dict[Hashable, asyncio.Task] = {}
+        self._results: dict[Hashable, tuple[float, Any]] = {}
+        self.sent = 0
+        self.shared = 0
+        self.cache_hits = 0
+
+    async def async_request(
+        self, key: Hashable, request: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """Return the response for ``key``, sending the request only if needed."""
+        cached = self._results.get(key)
+        if cached is not None:
+            if cached[0] > time.monotonic():
+                self.cache_hits += 1
+                return cached[1]
+            del self._results[key]
+
+        task = self._in_flight.get(key)
+        if task is None:
+            self.sent += 1
+            task = asyncio.ensure_future(request())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._async_request_done(key, done))
+        else:
+            self.shared += 1
+        # A caller giving up must not cancel the request for the others.
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict[str, Any]:
+        """Return how many requests were answered without being sent."""
+        requests = self.sent + self.shared + self.cache_hits
+        return {
+            "sent": self.sent,
+            "shared": self.shared,
+            "cache_hits": self.cache_hits,
+            "hit_ratio": (
+                round((self.shared + self.cache_hits) / requests, 3) if requests else None
+            ),
+        }
+
+    def _async_request_done(self, key: Hashable, task: asyncio.Task) -> None:
+        """Forget the finished request, keeping a successful response for a while."""
+        self._in_flight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        # An expired token or a reached limit has to be retried by later callers.
+        result = task.result()
+        if isinstance(result, dict) and result.get("code") in SUCCESS_CODES:
+            self._results[key] = (time.monotonic() + RESULT_CACHE_TTL, result)
@@ -10,12 +10,29 @@ from homeassistant.const import CONF_EMAIL, CONF_PASSWORD
 from homeassistant.core import callback
 from homeassistant.data_entry_flow import FlowResult
 from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
 
+from . import (
+    async_get_station_catalog,
+    async_get_stop_catalog,
+    async_get_token_manager,
+)
+from .cache import EMTCatalog
 from .const import (
     CONF_LINES,
+    CONF_MAX_CONCURRENT_REQUESTS,
+    CONF_MIN_AVAILABLE,
+    CONF_NEARBY_COUNT,
+    CONF_REQUEST_TIMEOUT,
     CONF_SENSOR_TYPE,
+    CONF_STALE_AFTER,
     CONF_STATION_ID,
     CONF_STOP_ID,
+    DEFAULT_MAX_CONCURRENT_REQUESTS,
+    DEFAULT_MIN_AVAILABLE,
+    DEFAULT_NEARBY_COUNT,
+    DEFAULT_REQUEST_TIMEOUT,
+    DEFAULT_STALE_AFTER,
     DOMAIN,
     SENSOR_TYPE_BICIMAD,
     SENSOR_TYPE_BUS,
@@ -24,6 +41,10 @@ from .emt_madrid import APIEMT
 
 _LOGGER = logging.getLogger(__name__)
 
+NEARBY_LIMIT = 5
+# Options of the fetch engine every bus stop shares.
+ENGINE_OPTIONS = (CONF_MAX_CONCURRENT_REQUESTS, CONF_REQUEST_TIMEOUT)
+
 DATA_SCHEMA_USER = vol.Schema(
     {
         vol.Required(CONF_EMAIL): cv.string,
@@ -72,11 +93,9 @@ class EMTMadridConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             email = first_entry.data.get(CONF_EMAIL)
             password = first_entry.data.get(CONF_PASSWORD)
             if email and password:
-                self._api = APIEMT(email, password)
+                self._api = self._async_get_api(email, password)
                 try:
-                    token = await self.hass.async_add_executor_job(
-                        self._api.authenticate
-                    )
+                    token = await self._api.authenticate()
                     if token and token != "Invalid token":
                         self._email = email
                         self._password = password
@@ -89,14 +108,15 @@ class EMTMadridConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             email = user_input[CONF_EMAIL]
             password = user_input[CONF_PASSWORD]
 
-            self._api = APIEMT(email, password)
+            # The credentials are checked apart, so that a wrong password does not
+            # replace the token manager the entries of the account share.
+            api = APIEMT(async_get_clientsession(self.hass), email, password)
             try:
-                token = await self.hass.async_add_executor_job(
-                    self._api.authenticate
-                )
+                token = await api.authenticate()
                 if token == "Invalid token" or token is None:
                     errors["base"] = "invalid_auth"
                 else:
+                    self._api = self._async_get_api(email, password)
                     self._email = email
                     self._password = password
                     self._token = token
@@ -112,6 +132,16 @@ class EMTMadridConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             errors=errors,
         )
 
+    @callback
+    def _async_get_api(self, email: str, password: str) -> APIEMT:
+        """Return a client that shares the account token with the entries."""
+        return APIEMT(
+            async_get_clientsession(self.hass),
+            email,
+            password,
+            async_get_token_manager(self.hass, email, password),
+        )
+
     async def _update_existing_entries(self, email: str, password: str) -> None:
         """Update credentials in all existing config entries."""
         for entry in self._async_current_entries():
@@ -177,6 +207,11 @@ class EMTMadridConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             step_id="bus",
             data_schema=DATA_SCHEMA_BUS,
             errors=errors,
+            description_placeholders={
+                "nearby_stops": await self._async_nearby(
+                    async_get_stop_catalog(self.hass)
+                )
+            },
         )
 
     async def async_step_bicimad(
@@ -205,33 +240,43 @@ class EMTMadridConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             {vol.Required(CONF_STATION_ID): cv.positive_int}
         )
 
-        if self._api is not None and self._api.get_token():
-            stations = await self.hass.async_add_executor_job(
-                self._api.get_all_bicimad_stations
-            )
-            if stations:
-                stations.sort(key=lambda s: s.get("id", 0))
-                station_options = {
-                    station["id"]: (
-                        f"{station.get('number', '?')} - "
-                        f"{station.get('name', 'Unknown')}"
-                    )
-                    for station in stations
-                    if "id" in station
-                }
-                if station_options:
-                    data_schema = vol.Schema(
-                        {
-                            vol.Required(CONF_STATION_ID): vol.In(
-                                station_options
-                            )
-                        }
-                    )
+        if self._api is not None and self._token:
+            station_options = await async_get_station_catalog(
+                self.hass
+            ).async_get_options(self._api)
+            if station_options:
+                data_schema = vol.Schema(
+                    {vol.Required(CONF_STATION_ID): vol.In(station_options)}
+                )
 
         return self.async_show_form(
             step_id="bicimad",
             data_schema=data_schema,
             errors=errors,
+            description_placeholders={
+                "nearby_stations": await self._async_nearby(
+                    async_get_station_catalog(self.hass)
+                )
+            },
+        )
+
+    async def _async_nearby(self, catalog: EMTCatalog) -> str:
+        """Return the catalogued stops or stations closest to the home location."""
+        if self._api is None:
+            return "-"
+        try:
+            await catalog.async_update(self._api)
+        except Exception:
+            _LOGGER.exception("Error fetching the catalogue for the closest stops")
+            return "-"
+        nearby = catalog.index.nearest(
+            self.hass.config.latitude, self.hass.config.longitude, NEARBY_LIMIT
+        )
+        if not nearby:
+            return "-"
+        return ", ".join(
+            f"{item['id']} - {item.get('name') or 'Unknown'} ({round(meters)} m)"
+            for meters, item in nearby
         )
 
     @staticmethod
@@ -256,33 +301,83 @@ class EMTMadridOptionsFlowHandler(config_entries.OptionsFlow):
         """Manage the options."""
         sensor_type = self._config_entry.data.get(CONF_SENSOR_TYPE)
 
-        if sensor_type == SENSOR_TYPE_BUS:
-            if user_input is not None:
+        if user_input is not None:
+            data = {CONF_STALE_AFTER: user_input[CONF_STALE_AFTER]}
+            if sensor_type == SENSOR_TYPE_BUS:
                 lines_raw = user_input.get(CONF_LINES, "")
-                lines = (
+                data[CONF_LINES] = (
                     [line.strip() for line in lines_raw.split(",") if line.strip()]
                     if lines_raw
                     else []
                 )
-                return self.async_create_entry(
-                    title="",
-                    data={
-                        CONF_LINES: lines,
-                    },
-                )
-
+                engine_options = {key: user_input[key] for key in ENGINE_OPTIONS}
+                data.update(engine_options)
+                self._async_share_engine_options(engine_options)
+            elif sensor_type == SENSOR_TYPE_BICIMAD:
+                data[CONF_MIN_AVAILABLE] = user_input[CONF_MIN_AVAILABLE]
+                data[CONF_NEARBY_COUNT] = user_input[CONF_NEARBY_COUNT]
+            return self.async_create_entry(title="", data=data)
+
+        schema: dict[Any, Any] = {}
+        if sensor_type == SENSOR_TYPE_BUS:
             current_lines = self._config_entry.data.get(CONF_LINES, [])
             lines_str = ", ".join(current_lines) if current_lines else ""
+            schema[vol.Optional(CONF_LINES, default=lines_str)] = cv.string
+            options = self._config_entry.options
+            schema[
+                vol.Optional(
+                    CONF_MAX_CONCURRENT_REQUESTS,
+                    default=options.get(
+                        CONF_MAX_CONCURRENT_REQUESTS, DEFAULT_MAX_CONCURRENT_REQUESTS
+                    ),
+                )
+            ] = vol.All(vol.Coerce(int), vol.Range(min=1, max=50))
+            schema[
+                vol.Optional(
+                    CONF_REQUEST_TIMEOUT,
+                    default=options.get(CONF_REQUEST_TIMEOUT, DEFAULT_REQUEST_TIMEOUT),
+                )
+            ] = vol.All(vol.Coerce(int), vol.Range(min=1, max=60))
 
-            data_schema = vol.Schema(
-                {
-                    vol.Optional(CONF_LINES, default=lines_str): cv.string,
-                }
-            )
+        stale_after = self._config_entry.options.get(
+            CONF_STALE_AFTER, DEFAULT_STALE_AFTER
+        )
+        schema[vol.Optional(CONF_STALE_AFTER, default=stale_after)] = vol.All(
+            vol.Coerce(int), vol.Range(min=1)
+        )
+        if sensor_type == SENSOR_TYPE_BICIMAD:
+            options = self._config_entry.options
+            schema[
+                vol.Optional(
+                    CONF_MIN_AVAILABLE,
+                    default=options.get(CONF_MIN_AVAILABLE, DEFAULT_MIN_AVAILABLE),
+                )
+            ] = vol.All(vol.Coerce(int), vol.Range(min=1))
+            schema[
+                vol.Optional(
+                    CONF_NEARBY_COUNT,
+                    default=options.get(CONF_NEARBY_COUNT, DEFAULT_NEARBY_COUNT),
+                )
+            ] = vol.All(vol.Coerce(int), vol.Range(min=1, max=30))
 
-            return self.async_show_form(
-                step_id="init",
-                data_schema=data_schema,
-            )
+        return self.async_show_form(
+            step_id="init",
+            data_schema=vol.Schema(schema),
+        )
 
-        return self.async_create_entry(title="", data={})
+    @callback
+    def _async_share_engine_options(self, engine_options: dict[str, Any]) -> None:
+        """Copy the fetch engine options to every other bus stop, since they share it."""
+        for entry in self.hass.config_entries.async_entries(DOMAIN):
+            if (
+                entry.entry_id == self._config_entry.entry_id
+                or entry.data.get(CONF_SENSOR_TYPE) != SENSOR_TYPE_BUS
+                or all(
+                    entry.options.get(key) == value
+                    for key, value in engine_options.items()
+                )
+            ):
+                continue
+            self.hass.config_entries.async_update_entry(
+                entry, options={**entry.options, **engine_options}
+            )
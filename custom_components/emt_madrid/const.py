@@ -4,18 +4,44 @@ from homeassistant.const import CONF_EMAIL, CONF_PASSWORD
 
 DOMAIN = "emt_madrid"
 
+DATA_TOKEN_MANAGERS = "token_managers"
+DATA_BICIMAD_COORDINATORS = "bicimad_coordinators"
+DATA_STOP_CACHE = "stop_cache"
+DATA_STATION_CATALOG = "station_catalog"
+DATA_STOP_CATALOG = "stop_catalog"
+DATA_FETCH_ENGINE = "fetch_engine"
+DATA_ENTRY_COORDINATORS = "entry_coordinators"
+
+DEFAULT_MAX_CONCURRENT_REQUESTS = 8
+DEFAULT_REQUEST_TIMEOUT = 10
+DEFAULT_STALE_AFTER = 15
+DEFAULT_MIN_AVAILABLE = 1
+DEFAULT_NEARBY_COUNT = 3
+
 CONF_STOP_ID = "stop_id"
 CONF_STATION_ID = "station_id"
 CONF_LINES = "lines"
 CONF_SENSOR_TYPE = "sensor_type"
+CONF_STALE_AFTER = "stale_after"
+CONF_MAX_CONCURRENT_REQUESTS = "max_concurrent_requests"
+CONF_REQUEST_TIMEOUT = "request_timeout"
+CONF_MIN_AVAILABLE = "min_available"
+CONF_NEARBY_COUNT = "nearby_count"
 
 SENSOR_TYPE_BUS = "bus"
 SENSOR_TYPE_BICIMAD = "bicimad"
 
 DEFAULT_BUS_ICON = "mdi:bus"
 DEFAULT_BICIMAD_ICON = "mdi:bike"
+DEFAULT_BICIMAD_NEARBY_ICON = "mdi:map-marker-radius"
+DEFAULT_API_ICON = "mdi:timer-outline"
 
 ATTR_NEXT_BUS = "next_bus"
+ATTR_ARRIVAL_SECONDS = "arrival_seconds"
+ATTR_NEXT_BUS_SECONDS = "next_bus_seconds"
+ATTR_HAS_ESTIMATE = "has_estimate"
+ATTR_STALE = "stale"
+ATTR_DATA_AGE = "data_age_seconds"
 ATTR_STOP_ID = "stop_id"
 ATTR_STOP_NAME = "stop_name"
 ATTR_STOP_ADDRESS = "stop_address"
@@ -36,5 +62,26 @@ ATTR_LONGITUDE = "longitude"
 ATTR_STATION_ADDRESS = "station_address"
 ATTR_FREE_BASES = "free_bases"
 ATTR_BIKES = "bikes"
+ATTR_NEARBY_STATIONS = "nearby_stations"
+
+ATTR_REQUESTS = "requests"
+ATTR_ERRORS = "errors"
+ATTR_BYTES_RECEIVED = "bytes_received"
+ATTR_MAX_LATENCY = "max_latency_ms"
+ATTR_LATENCY_HISTOGRAM = "latency_histogram"
+ATTR_RESPONSE_CODES = "response_codes"
+ATTR_PARSE_TIME = "parse_time_ms"
 
 ATTRIBUTION = "Data provided by EMT Madrid MobilityLabs"
+
+SERVICE_CLOSEST_STOPS = "closest_stops"
+ATTR_RADIUS = "radius"
+ATTR_LIMIT = "limit"
+ATTR_INCLUDE_BUS = "include_bus"
+ATTR_INCLUDE_BICIMAD = "include_bicimad"
+DEFAULT_CLOSEST_RADIUS = 500
+DEFAULT_CLOSEST_LIMIT = 10
+
+SERVICE_NEAREST_STATIONS = "nearest_bicimad_stations"
+ATTR_MIN_BIKES = "min_bikes"
+ATTR_MIN_FREE_BASES = "min_free_bases"
@@ -0,0 +1,321 @@
+"""Data update coordinators for EMT Madrid integration."""
+
+from __future__ import annotations
+
+from abc import abstractmethod
+import asyncio
+from collections.abc import Callable, Mapping
+from functools import partial
+from datetime import timedelta
+import logging
+import time
+from typing import Any, TypeVar
+
+import aiohttp
+
+from homeassistant import config_entries
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+from homeassistant.util import dt as dt_util
+
+from .bicimad import BicimadEMT
+from .buses import BusesEMT
+from .cache import EMTStopCache
+from .const import DATA_BICIMAD_COORDINATORS, DOMAIN
+from .emt_madrid import APIEMT
+from .engine import EMTFetchEngine
+from .models import Station, Stop, StopArrivals
+from .quota import QuotaScheduler
+from .scheduler import bus_stop_interval
+from .spatial import NEIGHBOUR_COUNT, NeighbourTable
+
+_LOGGER = logging.getLogger(__name__)
+
+_DataT = TypeVar("_DataT")
+
+SCAN_INTERVAL = timedelta(minutes=1)
+
+
+class EMTCoordinator(DataUpdateCoordinator[_DataT]):
+    """Base coordinator that paces its polling to the daily quota of the account."""
+
+    def __init__(self, hass: HomeAssistant, client: APIEMT, name: str) -> None:
+        """Initialize the coordinator."""
+        super().__init__(
+            hass,
+            _LOGGER,
+            name=name,
+            update_interval=SCAN_INTERVAL,
+            always_update=False,
+        )
+        self._client = client
+        self.data_updated_at: float | None = None
+        self.next_refresh: float | None = None
+        token_manager = client.token_manager
+        self.quota = (
+            token_manager.quota if token_manager is not None else QuotaScheduler()
+        )
+
+    @callback
+    def async_add_listener(
+        self, update_callback: CALLBACK_TYPE, context: Any = None
+    ) -> Callable[[], None]:
+        """Listen for data updates, counting against the quota while listened to."""
+        remove_listener = super().async_add_listener(update_callback, context)
+        self.quota.register(self.name, self._preferred_interval())
+
+        @callback
+        def _remove_listener() -> None:
+            remove_listener()
+            if not self._listeners:
+                self.quota.unregister(self.name)
+
+        return _remove_listener
+
+    @property
+    def client(self) -> APIEMT:
+        """Return the API client that fetches the data."""
+        return self._client
+
+    @property
+    def data_age(self) -> float | None:
+        """Return the seconds since the data was last fetched successfully."""
+        if self.data_updated_at is None:
+            return None
+        return time.monotonic() - self.data_updated_at
+
+    @property
+    def polling_disabled(self) -> bool:
+        """Return whether the user turned off polling for the config entry."""
+        return self.config_entry is not None and self.config_entry.pref_disable_polling
+
+    @property
+    def next_poll_in(self) -> float | None:
+        """Return the seconds until the next scheduled poll, if any."""
+        if self.next_refresh is None:
+            return None
+        return max(self.next_refresh - self.hass.loop.time(), 0)
+
+    @callback
+    def async_revalidate(self) -> None:
+        """Refresh the data in the background, keeping the current data meanwhile."""
+        self.hass.async_create_background_task(
+            self.async_refresh(), f"{self.name} revalidate"
+        )
+
+    @callback
+    def _schedule_refresh(self) -> None:
+        """Schedule the next poll and remember when it happens."""
+        super()._schedule_refresh()
+        if self.update_interval is not None:
+            self.next_refresh = (
+                self.hass.loop.time() + self.update_interval.total_seconds()
+            )
+
+    @callback
+    def _unschedule_refresh(self) -> None:
+        """Cancel the next poll."""
+        super()._unschedule_refresh()
+        self.next_refresh = None
+
+    async def _async_update_data(self) -> _DataT:
+        """Fetch new data, then schedule the next poll within the quota."""
+        try:
+            data = await self._async_fetch_data()
+            self.data_updated_at = time.monotonic()
+            return data
+        finally:
+            interval = self._preferred_interval()
+            if self._listeners:
+                self.quota.register(self.name, interval)
+            update_interval = self.quota.get_interval(self.name, interval)
+            if (retry_delay := self._client.get_retry_delay()) is not None:
+                update_interval = max(update_interval, timedelta(seconds=retry_delay))
+            self.update_interval = update_interval
+
+    @abstractmethod
+    async def _async_fetch_data(self) -> _DataT:
+        """Fetch new data from the API."""
+
+    def _preferred_interval(self) -> timedelta:
+        """Return how often the coordinator would like to poll."""
+        return SCAN_INTERVAL
+
+
+class EMTBusCoordinator(EMTCoordinator[StopArrivals]):
+    """Fetch the arrivals of a bus stop once per cycle for all its line sensors."""
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        buses_emt: BusesEMT,
+        stop_id: int,
+        stop_cache: EMTStopCache,
+        engine: EMTFetchEngine,
+    ) -> None:
+        """Initialize the coordinator."""
+        super().__init__(hass, buses_emt, f"{DOMAIN}_bus_{stop_id}")
+        self.buses_emt = buses_emt
+        self.stop_id = stop_id
+        self._stop_cache = stop_cache
+        self._engine = engine
+        self._unsub_engine: CALLBACK_TYPE | None = None
+
+    async def async_setup_stop(self) -> Stop:
+        """Load the stop details, from disk if possible, then the first arrivals."""
+        stop_info, expired = await self._stop_cache.async_get(self.stop_id)
+        if stop_info is None:
+            await self._async_update_stop_info()
+        else:
+            self.buses_emt.restore_stop_info(Stop.from_dict(stop_info))
+            if expired:
+                self.hass.async_create_background_task(
+                    self._async_refresh_stop_info(),
+                    f"{DOMAIN} refresh stop {self.stop_id} details",
+                )
+        await self.async_config_entry_first_refresh()
+        self._unsub_engine = self._engine.async_add(self)
+        return self.buses_emt.get_stop_info()
+
+    async def async_shutdown(self) -> None:
+        """Stop polling the stop in the fetch cycles."""
+        await super().async_shutdown()
+        if self._unsub_engine is not None:
+            self._unsub_engine()
+            self._unsub_engine = None
+
+    @callback
+    def _schedule_refresh(self) -> None:
+        """Leave the next poll to the fetch engine, which batches every due stop."""
+        if self.update_interval is None or self.polling_disabled:
+            return
+        self.next_refresh = self.hass.loop.time() + self.update_interval.total_seconds()
+
+    @property
+    def stop_cache(self) -> EMTStopCache:
+        """Return the on-disk cache of the stop details."""
+        return self._stop_cache
+
+    async def _async_update_stop_info(self) -> None:
+        """Fetch the stop details from the API and keep them on disk."""
+        await self.buses_emt.update_stop_info(self.stop_id)
+        stop = self.buses_emt.get_stop_info()
+        if stop.lines:
+            await self._stop_cache.async_set(self.stop_id, stop.as_dict())
+
+    async def _async_refresh_stop_info(self) -> None:
+        """Refresh expired stop details without delaying the setup."""
+        try:
+            await self._async_update_stop_info()
+        except (aiohttp.ClientError, TimeoutError, ValueError) as err:
+            _LOGGER.debug("Unable to refresh details of stop %s: %s", self.stop_id, err)
+            return
+        # The arrivals are kept, so the sensors only need the new stop details.
+        self.async_update_listeners()
+
+    async def _async_fetch_data(self) -> StopArrivals:
+        """Fetch the arrival times of every line at the stop."""
+        previous = self.buses_emt.get_arrivals()
+        try:
+            await self._engine.async_fetch(
+                partial(self.buses_emt.update_arrival_times, self.stop_id)
+            )
+        except (aiohttp.ClientError, TimeoutError, ValueError) as err:
+            raise UpdateFailed(
+                f"Error fetching arrival times for stop {self.stop_id}: {err}"
+            ) from err
+        arrivals = self.buses_emt.get_arrivals()
+        # Without a token or with an error code the old arrivals are kept, and
+        # they must keep ageing.
+        if arrivals is previous:
+            raise UpdateFailed(f"No arrival times received for stop {self.stop_id}")
+        return arrivals
+
+    def _preferred_interval(self) -> timedelta:
+        """Poll often while a bus is close and rest outside the service hours."""
+        lines = self.buses_emt.get_stop_info().lines
+        return bus_stop_interval(
+            (self.buses_emt.get_arrival_time(line)[0] for line in lines),
+            ((line_info.start_time, line_info.end_time) for line_info in lines.values()),
+            dt_util.now(),
+        )
+
+
+class EMTBicimadCoordinator(EMTCoordinator[Mapping[int, Station]]):
+    """Fetch every BiciMad station once per cycle for all station sensors."""
+
+    def __init__(self, hass: HomeAssistant, bicimad_emt: BicimadEMT) -> None:
+        """Initialize the coordinator."""
+        # Every station entry of the account shares the coordinator, so it is
+        # bound to none of them and each entry shuts it down on unload.
+        token = config_entries.current_entry.set(None)
+        try:
+            super().__init__(hass, bicimad_emt, f"{DOMAIN}_bicimad")
+        finally:
+            config_entries.current_entry.reset(token)
+        self.bicimad_emt = bicimad_emt
+        self._first_refresh_lock = asyncio.Lock()
+        self._neighbours: NeighbourTable[int] = NeighbourTable({})
+
+    async def async_ensure_first_refresh(self) -> None:
+        """Fetch the network once, however many entries are being set up."""
+        async with self._first_refresh_lock:
+            if self.data is None:
+                await self.async_config_entry_first_refresh()
+
+    async def async_shutdown(self) -> None:
+        """Shut down only once no station sensor of any entry is listening."""
+        if self._listeners:
+            return
+        await super().async_shutdown()
+        coordinators = self.hass.data.get(DOMAIN, {}).get(DATA_BICIMAD_COORDINATORS, {})
+        for email, coordinator in list(coordinators.items()):
+            if coordinator is self:
+                coordinators.pop(email)
+
+    async def _async_fetch_data(self) -> Mapping[int, Station]:
+        """Fetch the state of the whole BiciMad network."""
+        previous = self.bicimad_emt.get_all_stations_info()
+        try:
+            await self.bicimad_emt.update_all_stations()
+        except (aiohttp.ClientError, TimeoutError, ValueError) as err:
+            raise UpdateFailed(f"Error fetching BiciMad stations: {err}") from err
+        stations = self.bicimad_emt.get_all_stations_info()
+        if stations is previous:
+            raise UpdateFailed("No BiciMad stations received")
+        positions = {
+            station_id: (station.latitude, station.longitude)
+            for station_id, station in stations.items()
+            if station.coordinates
+        }
+        # Stations rarely move, so the neighbours looked up so far are kept.
+        if positions != self._neighbours.points:
+            self._neighbours = NeighbourTable(positions)
+        return stations
+
+    def nearest_available(
+        self,
+        station_id: int,
+        limit: int,
+        min_bikes: int = 0,
+        min_free_bases: int = 0,
+    ) -> list[tuple[float, Station]]:
+        """Return the stations closest to a station with enough bikes and free bases."""
+        count = NEIGHBOUR_COUNT
+        while True:
+            neighbours = self._neighbours.neighbours(station_id, count)
+            found = []
+            for meters, neighbour_id in neighbours:
+                station = self.data.get(neighbour_id) if self.data else None
+                if (
+                    station is not None
+                    and (station.docked_bikes or 0) >= min_bikes
+                    and (station.free_bases or 0) >= min_free_bases
+                ):
+                    found.append((meters, station))
+                    if len(found) == limit:
+                        return found
+            # Look further only while there are stations left within the radius.
+            if len(neighbours) < count:
+                return found
+            count *= 2
@@ -0,0 +1,113 @@
+"""Diagnostics support for EMT Madrid."""
+
+from __future__ import annotations
+
+from dataclasses import asdict
+import time
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_EMAIL, CONF_PASSWORD
+from homeassistant.core import HomeAssistant
+
+from . import async_get_entry_coordinator, async_get_station_catalog
+from .const import CONF_STATION_ID
+from .coordinator import EMTBicimadCoordinator, EMTBusCoordinator, EMTCoordinator
+from .emt_madrid import TokenManager
+
+TO_REDACT = {CONF_EMAIL, CONF_PASSWORD, "accessToken"}
+
+
+def _seconds(value: float | None) -> float | None:
+    """Round a duration in seconds for the dump."""
+    return round(value, 1) if value is not None else None
+
+
+def _coordinator_state(coordinator: EMTCoordinator) -> dict[str, Any]:
+    """Return the polling state of a coordinator."""
+    update_interval = coordinator.update_interval
+    return {
+        "name": coordinator.name,
+        "last_update_success": coordinator.last_update_success,
+        "update_interval_seconds": (
+            update_interval.total_seconds() if update_interval is not None else None
+        ),
+        "data_age_seconds": _seconds(coordinator.data_age),
+        "next_poll_in_seconds": _seconds(coordinator.next_poll_in),
+        "retry_delay_seconds": _seconds(coordinator.client.get_retry_delay()),
+    }
+
+
+def _bus_state(coordinator: EMTBusCoordinator) -> dict[str, Any]:
+    """Return what the client of a bus stop holds."""
+    buses_emt = coordinator.buses_emt
+    arrivals = buses_emt.get_arrivals()
+    return {
+        "stop": buses_emt.get_stop_info().as_dict(),
+        "arrivals": {
+            line: asdict(line_arrivals) for line, line_arrivals in arrivals.lines.items()
+        },
+        "arrivals_age_seconds": _seconds(
+            time.monotonic() - arrivals.updated_at
+            if arrivals.updated_at is not None
+            else None
+        ),
+        "stop_cache": coordinator.stop_cache.stats(),
+    }
+
+
+def _bicimad_state(
+    hass: HomeAssistant, coordinator: EMTBicimadCoordinator, station_id: int
+) -> dict[str, Any]:
+    """Return what the BiciMad client holds about the station of an entry."""
+    stations = coordinator.bicimad_emt.get_all_stations_info()
+    station = stations.get(station_id)
+    return {
+        "stations": len(stations),
+        "station": asdict(station) if station is not None else None,
+        "station_catalog": async_get_station_catalog(hass).stats(),
+    }
+
+
+def _account_state(token_manager: TokenManager) -> dict[str, Any]:
+    """Return the state shared by every client of an account."""
+    return {
+        "token_age_seconds": _seconds(token_manager.token_age),
+        "token_expires_in_seconds": _seconds(token_manager.token_expires_in),
+        "quota": {
+            "calls_today": token_manager.quota.calls_today,
+            "daily_limit": token_manager.quota.daily_limit,
+        },
+        "circuit_breakers": {
+            host: breaker.as_dict()
+            for host, breaker in token_manager.circuit_breakers.items()
+        },
+        "request_cache": token_manager.coalescer.stats(),
+    }
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    diagnostics: dict[str, Any] = {"entry": entry.as_dict()}
+    coordinator = async_get_entry_coordinator(hass, entry)
+    if coordinator is None:
+        return async_redact_data(diagnostics, TO_REDACT)
+
+    client = coordinator.client
+    diagnostics["coordinator"] = _coordinator_state(coordinator)
+    if isinstance(coordinator, EMTBusCoordinator):
+        diagnostics["client"] = _bus_state(coordinator)
+    elif isinstance(coordinator, EMTBicimadCoordinator):
+        diagnostics["client"] = _bicimad_state(
+            hass, coordinator, entry.data[CONF_STATION_ID]
+        )
+    if (token_manager := client.token_manager) is not None:
+        diagnostics["account"] = _account_state(token_manager)
+    diagnostics["metrics"] = {
+        "client": client.metrics.as_dict(),
+        "account": client.account_metrics.as_dict(),
+    }
+    return async_redact_data(diagnostics, TO_REDACT)
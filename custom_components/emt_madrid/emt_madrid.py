@@ -1,44 +1,137 @@
 """Support for EMT Madrid API."""
 
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Iterator
+from contextlib import contextmanager
+from functools import partial
 import json
 import logging
+import time
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from .breaker import CircuitBreaker
+from .coalesce import RequestCoalescer
+from .const import DEFAULT_REQUEST_TIMEOUT
+from .metrics import APIMetrics, EndpointMetrics
+from .quota import QuotaScheduler
 
 BASE_URL = "https://openapi.emtmadrid.es/"
 ENDPOINT_LOGIN = "v3/mobilitylabs/user/login/"
+TOKEN_EXPIRATION_MARGIN = 60
+CODE_INVALID_TOKEN = "80"
+CODE_API_LIMIT = "98"
 
 _LOGGER = logging.getLogger(__name__)
 
 
+class CircuitOpenError(aiohttp.ClientError):
+    """Raised instead of sending a request while the EMT API keeps failing."""
+
+
 class APIEMT:
     """A class representing an API client for EMT (Empresa Municipal de Transportes) services."""
 
-    def __init__(self, user: str, password: str) -> None:
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        user: str,
+        password: str,
+        token_manager: TokenManager | None = None,
+        base_url: str | None = None,
+    ) -> None:
         """Initialize an instance of the APIEMT class."""
+        if base_url is None:
+            # Clients of an account talk to the server its token manager logs in to.
+            base_url = (
+                token_manager.api.base_url if token_manager is not None else BASE_URL
+            )
+        self.base_url = base_url
+        self.request_timeout: float = DEFAULT_REQUEST_TIMEOUT
+        self._session = session
         self._user = user
         self._password = password
+        self._token_manager = token_manager
         self._token: str | None = None
+        self._token_lifetime: int | None = None
+        self._api_counter: dict | None = None
+        self._refresh_lock = asyncio.Lock()
+        self._coalescer = (
+            token_manager.coalescer if token_manager is not None else RequestCoalescer()
+        )
+        self._circuit_breakers: dict[str, CircuitBreaker] = (
+            token_manager.circuit_breakers if token_manager is not None else {}
+        )
+        self.metrics = APIMetrics()
+        self.account_metrics = (
+            token_manager.metrics if token_manager is not None else self.metrics
+        )
 
-    def authenticate(self) -> str | None:
+    async def authenticate(self) -> str | None:
         """Authenticate the user using the provided credentials."""
+        if self._token_manager is not None:
+            return await self._async_ensure_token()
         headers = {"email": self._user, "password": self._password}
-        url = f"{BASE_URL}{ENDPOINT_LOGIN}"
-        response = self._make_request(url, headers=headers, method="GET")
+        url = f"{self.base_url}{ENDPOINT_LOGIN}"
+        response = await self._async_request(url, headers=headers, method="GET")
         self._token = self._extract_token(response)
+        self._token_lifetime = self._extract_token_lifetime(response)
+        self._api_counter = self._extract_api_counter(response)
         return self._token
 
     def get_token(self) -> str | None:
         """Return the current access token."""
         return self._token
 
-    def get_all_bicimad_stations(self) -> list[dict] | None:
+    @property
+    def token_manager(self) -> TokenManager | None:
+        """Return the token manager shared with other clients, if any."""
+        return self._token_manager
+
+    def has_credentials(self, user: str, password: str) -> bool:
+        """Return whether the client logs in with the given credentials."""
+        return self._user == user and self._password == password
+
+    def get_token_lifetime(self) -> int | None:
+        """Return the lifetime in seconds of the current access token."""
+        return self._token_lifetime
+
+    def get_api_counter(self) -> dict | None:
+        """Return the API usage counters received with the last login."""
+        return self._api_counter
+
+    def get_retry_delay(self) -> float | None:
+        """Return the seconds until the API is tried again, if it is failing."""
+        breaker = self._circuit_breakers.get(urlsplit(self.base_url).netloc)
+        return breaker.retry_in() if breaker is not None else None
+
+    async def _async_ensure_token(self) -> str | None:
+        """Pick up the current shared token before sending a request."""
+        if self._token_manager is not None:
+            self._token = await self._token_manager.async_get_token()
+        return self._token
+
+    async def _async_refresh_token(self, stale_token: str) -> str | None:
+        """Log in again after the API rejected a token, once for concurrent callers."""
+        if self._token_manager is not None:
+            self._token = await self._token_manager.async_refresh_token(stale_token)
+            return self._token
+        async with self._refresh_lock:
+            if self._token == stale_token:
+                await self.authenticate()
+        return self._token
+
+    async def get_all_bicimad_stations(self) -> list[dict] | None:
         """Fetch all available BiciMad stations."""
-        url = f"{BASE_URL}v3/transport/bicimad/stations/"
-        headers = {"accessToken": self._token}
-        if self._token is None:
-            _LOGGER.warning("Cannot fetch stations: not authenticated")
-            return None
+        url = f"{self.base_url}v3/transport/bicimad/stations/"
         try:
-            response = self._make_request(url, headers=headers, method="GET")
+            response = await self._make_authenticated_request(url, method="GET")
+            if response is None:
+                _LOGGER.warning("Cannot fetch stations: not authenticated")
+                return None
             if response.get("code") in ("00", "01"):
                 return response.get("data", [])
             _LOGGER.warning(
@@ -50,6 +143,24 @@ class APIEMT:
             _LOGGER.exception("Error fetching BiciMad stations list")
             return None
 
+    async def get_all_bus_stops(self) -> list[dict] | None:
+        """Fetch every bus stop of the network."""
+        url = f"{self.base_url}v3/transport/busemtmad/stops/list/"
+        try:
+            response = await self._make_authenticated_request(url, data={}, method="POST")
+            if response is None:
+                _LOGGER.warning("Cannot fetch bus stops: not authenticated")
+                return None
+            if response.get("code") in ("00", "01"):
+                return response.get("data", [])
+            _LOGGER.warning(
+                "Failed to fetch bus stops list (code: %s)", response.get("code")
+            )
+            return None
+        except Exception:
+            _LOGGER.exception("Error fetching bus stops list")
+            return None
+
     def _extract_token(self, response: dict) -> str | None:
         """Extract the access token from the API response."""
         try:
@@ -61,20 +172,223 @@ class APIEMT:
             _LOGGER.exception("Unable to get token from the API")
             return None
 
-    def _make_request(
+    def _extract_api_counter(self, response: dict) -> dict | None:
+        """Extract the daily API usage counters from the login response."""
+        try:
+            return response["data"][0]["apiCounter"]
+        except (KeyError, IndexError, TypeError):
+            return None
+
+    def _extract_token_lifetime(self, response: dict) -> int | None:
+        """Extract the token lifetime in seconds from the API response."""
+        try:
+            return int(response["data"][0]["tokenSecExpiration"])
+        except (KeyError, IndexError, TypeError, ValueError):
+            return None
+
+    async def _make_authenticated_request(
+        self, url: str, data: dict | None = None, method: str = "POST"
+    ) -> dict | None:
+        """Send a request, sharing the response with identical requests."""
+        key = (method, url, json.dumps(data, sort_keys=True))
+        return await self._coalescer.async_request(
+            key, partial(self._async_authenticated_request, url, data, method)
+        )
+
+    async def _async_authenticated_request(
+        self, url: str, data: dict | None, method: str
+    ) -> dict | None:
+        """Send a request with the access token, retrying once if it expired."""
+        token = await self._async_ensure_token()
+        if token is None:
+            return None
+        response = await self._async_send(url, token, data, method)
+        if response.get("code") != CODE_INVALID_TOKEN:
+            return response
+
+        _LOGGER.debug("Access token rejected, logging in again")
+        self._record_retry("invalid_token")
+        token = await self._async_refresh_token(token)
+        if token is None:
+            return response
+        return await self._async_send(url, token, data, method)
+
+    async def _async_send(
+        self, url: str, token: str, data: dict | None, method: str
+    ) -> dict:
+        """Send an authenticated request and account for it in the daily quota."""
+        quota = self._token_manager.quota if self._token_manager is not None else None
+        if quota is not None:
+            quota.record_call()
+        response = await self._async_request(
+            url, headers={"accessToken": token}, data=data, method=method
+        )
+        if response.get("code") == CODE_API_LIMIT and quota is not None:
+            quota.record_limit_reached()
+        return response
+
+    def _endpoint_metrics(self, url: str) -> list[EndpointMetrics]:
+        """Return the metrics of an endpoint for this client and its account."""
+        metrics = [self.metrics.endpoint(url)]
+        if self.account_metrics is not self.metrics:
+            metrics.append(self.account_metrics.endpoint(url))
+        return metrics
+
+    def _record_retry(self, reason: str) -> None:
+        """Count a request sent again, or replaced by another one."""
+        self.metrics.retries[reason] += 1
+        if self.account_metrics is not self.metrics:
+            self.account_metrics.retries[reason] += 1
+
+    @contextmanager
+    def _time_parse(self, parser: str) -> Iterator[None]:
+        """Measure how long parsing a response takes."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            self.metrics.record_parse(parser, duration)
+            if self.account_metrics is not self.metrics:
+                self.account_metrics.record_parse(parser, duration)
+
+    async def _async_request(
         self, url: str, headers: dict | None = None, data: dict | None = None, method: str = "POST"
     ) -> dict:
-        """Send an HTTP request to the specified URL."""
-        import requests
+        """Send a request unless the circuit breaker of the host is open."""
+        host = urlsplit(url).netloc
+        breaker = self._circuit_breakers.setdefault(host, CircuitBreaker())
+        if not breaker.allow_request():
+            raise CircuitOpenError(
+                f"{host} is failing, retrying in {breaker.retry_in():.0f} seconds"
+            )
+        metrics = self._endpoint_metrics(url)
+        start = time.perf_counter()
+        try:
+            response = await self._make_request(
+                url, headers=headers, data=data, method=method
+            )
+        except asyncio.CancelledError:
+            # A cancelled request says nothing about the host, but it must not
+            # leave the breaker waiting for its trial for good.
+            breaker.record_cancelled()
+            raise
+        except Exception:
+            # Every error settles a trial request, including a body that is
+            # not JSON, so the breaker cannot stay half-open for good.
+            breaker.record_failure()
+            for endpoint in metrics:
+                endpoint.record_error(time.perf_counter() - start)
+            raise
+        breaker.record_success()
+        latency = time.perf_counter() - start
+        for endpoint in metrics:
+            endpoint.record_response(latency, response.get("code"))
+        return response
 
+    async def _make_request(
+        self, url: str, headers: dict | None = None, data: dict | None = None, method: str = "POST"
+    ) -> dict:
+        """Send an HTTP request to the specified URL."""
         if method not in ("POST", "GET"):
             raise ValueError(f"Invalid HTTP method: {method}")
-        kwargs = {"url": url, "headers": headers, "timeout": 10}
+        kwargs = {
+            "headers": headers,
+            "timeout": aiohttp.ClientTimeout(total=self.request_timeout),
+        }
         if method == "POST":
             kwargs["data"] = json.dumps(data)
         try:
-            response = requests.request(method, **kwargs)
-            response.raise_for_status()
-            return response.json()
-        except requests.HTTPError as e:
-            raise requests.HTTPError(f"Error while connecting to EMT API: {e}") from e
+            async with self._session.request(method, url, **kwargs) as response:
+                response.raise_for_status()
+                body = await response.read()
+        except aiohttp.ClientResponseError as e:
+            raise aiohttp.ClientError(f"Error while connecting to EMT API: {e}") from e
+        for endpoint in self._endpoint_metrics(url):
+            endpoint.record_bytes(len(body))
+        return json.loads(body)
+
+
+class TokenManager:
+    """Share a single MobilityLabs access token between all clients of an account."""
+
+    def __init__(self, api: APIEMT) -> None:
+        """Initialize the token manager with the client used to log in."""
+        self._api = api
+        self._lock = asyncio.Lock()
+        self._token: str | None = None
+        self._logged_in_at: float | None = None
+        self._expires_at: float | None = None
+        self.quota = QuotaScheduler()
+        self.coalescer = RequestCoalescer()
+        self.circuit_breakers: dict[str, CircuitBreaker] = {}
+        self._client: APIEMT | None = None
+        # The logins of the account are counted along with its other requests.
+        self.metrics = api.metrics
+
+    @property
+    def api(self) -> APIEMT:
+        """Return the client used to log in."""
+        return self._api
+
+    def get_token(self) -> str | None:
+        """Return the current access token without logging in."""
+        return self._token
+
+    def create_client(self, session: aiohttp.ClientSession) -> APIEMT:
+        """Return a client that sends requests with the token of the account."""
+        return APIEMT(session, self._api._user, self._api._password, self)
+
+    def get_client(self, session: aiohttp.ClientSession) -> APIEMT:
+        """Return the client shared by the requests made outside a coordinator."""
+        if self._client is None:
+            self._client = self.create_client(session)
+        return self._client
+
+    @property
+    def token_age(self) -> float | None:
+        """Return the seconds since the account last logged in."""
+        if self._logged_in_at is None:
+            return None
+        return time.monotonic() - self._logged_in_at
+
+    @property
+    def token_expires_in(self) -> float | None:
+        """Return the seconds until the current token expires, if known."""
+        if self._expires_at is None:
+            return None
+        return self._expires_at - time.monotonic()
+
+    async def async_get_token(self) -> str | None:
+        """Return a valid access token, logging in only if there is none."""
+        if self._token is not None and not self._is_expired():
+            return self._token
+        async with self._lock:
+            # Another caller may have logged in while this one was waiting.
+            if self._token is None or self._is_expired():
+                await self._async_login()
+        return self._token
+
+    async def async_refresh_token(self, stale_token: str | None) -> str | None:
+        """Replace a token the API rejected, once for all concurrent callers."""
+        async with self._lock:
+            if self._token == stale_token:
+                await self._async_login()
+        return self._token
+
+    async def _async_login(self) -> None:
+        """Log in and remember when the new token expires."""
+        self.quota.record_call()
+        self._token = await self._api.authenticate()
+        self._logged_in_at = time.monotonic()
+        self.quota.update_counter(self._api.get_api_counter())
+        lifetime = self._api.get_token_lifetime()
+        self._expires_at = (
+            time.monotonic() + lifetime - TOKEN_EXPIRATION_MARGIN
+            if lifetime is not None
+            else None
+        )
+
+    def _is_expired(self) -> bool:
+        """Return whether the current token has reached its expiration."""
+        return self._expires_at is not None and time.monotonic() >= self._expires_at
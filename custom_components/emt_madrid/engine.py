@@ -0,0 +1,99 @@
+"""Batched polling of EMT Madrid bus stops."""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timedelta
+import logging
+from typing import TYPE_CHECKING, TypeVar
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.event import async_track_time_interval
+
+from .const import DEFAULT_MAX_CONCURRENT_REQUESTS, DEFAULT_REQUEST_TIMEOUT
+
+if TYPE_CHECKING:
+    from .coordinator import EMTBusCoordinator
+
+_LOGGER = logging.getLogger(__name__)
+
+_T = TypeVar("_T")
+
+FETCH_CYCLE_INTERVAL = timedelta(seconds=10)
+# A fetch may log in, send its request and send it again with a new token.
+REQUESTS_PER_FETCH = 3
+
+
+class EMTFetchEngine:
+    """Poll every due bus stop in one cycle with a bounded number of requests."""
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        max_concurrent_requests: int = DEFAULT_MAX_CONCURRENT_REQUESTS,
+        request_timeout: float = DEFAULT_REQUEST_TIMEOUT,
+    ) -> None:
+        """Initialize the engine."""
+        self.hass = hass
+        self._max_concurrent_requests = max_concurrent_requests
+        self._semaphore = asyncio.Semaphore(max_concurrent_requests)
+        self._fetch_timeout = request_timeout * REQUESTS_PER_FETCH
+        self._coordinators: set[EMTBusCoordinator] = set()
+        self._unsub_cycle: CALLBACK_TYPE | None = None
+
+    @callback
+    def async_configure(
+        self, max_concurrent_requests: int, request_timeout: float
+    ) -> None:
+        """Change how many requests run at once and how long each may take."""
+        if max_concurrent_requests != self._max_concurrent_requests:
+            # Requests holding a slot of the old semaphore release it when done.
+            self._max_concurrent_requests = max_concurrent_requests
+            self._semaphore = asyncio.Semaphore(max_concurrent_requests)
+        self._fetch_timeout = request_timeout * REQUESTS_PER_FETCH
+
+    @callback
+    def async_add(self, coordinator: EMTBusCoordinator) -> CALLBACK_TYPE:
+        """Poll a stop in the fetch cycles until the returned callback is called."""
+        self._coordinators.add(coordinator)
+        if self._unsub_cycle is None:
+            self._unsub_cycle = async_track_time_interval(
+                self.hass,
+                self._async_run_cycle,
+                FETCH_CYCLE_INTERVAL,
+                name="EMT Madrid fetch cycle",
+                cancel_on_shutdown=True,
+            )
+
+        @callback
+        def _remove() -> None:
+            self._coordinators.discard(coordinator)
+            if not self._coordinators and self._unsub_cycle is not None:
+                self._unsub_cycle()
+                self._unsub_cycle = None
+
+        return _remove
+
+    async def async_fetch(self, request: Callable[[], Awaitable[_T]]) -> _T:
+        """Run a request once a slot is free, giving up once its requests timed out."""
+        async with self._semaphore:
+            async with asyncio.timeout(self._fetch_timeout):
+                return await request()
+
+    async def _async_run_cycle(self, _now: datetime | None = None) -> None:
+        """Refresh every stop whose next poll is due, all at once."""
+        now = self.hass.loop.time()
+        due = [
+            coordinator
+            for coordinator in self._coordinators
+            if coordinator.next_refresh is not None
+            and coordinator.next_refresh <= now
+            and not coordinator.polling_disabled
+        ]
+        if not due:
+            return
+        _LOGGER.debug("Refreshing %s bus stops", len(due))
+        for coordinator in due:
+            coordinator.next_refresh = None
+        await asyncio.gather(*(coordinator.async_refresh() for coordinator in due))
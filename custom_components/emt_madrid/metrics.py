@@ -0,0 +1,159 @@
+"""Request and parsing metrics for the EMT Madrid API clients."""
+
+from __future__ import annotations
+
+from bisect import bisect_left
+from collections import Counter
+import re
+from typing import Any
+from urllib.parse import urlsplit
+
+# Upper bounds in seconds of the request latency histogram buckets.
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+def endpoint_name(url: str) -> str:
+    """Return the path of a URL with the stop and station IDs left out."""
+    return _ID_SEGMENT.sub("/{id}", urlsplit(url).path)
+
+
+class EndpointMetrics:
+    """Count the requests sent to an endpoint and how long they took."""
+
+    def __init__(self) -> None:
+        """Initialize empty metrics."""
+        self.requests = 0
+        self.errors = 0
+        self.bytes_received = 0
+        self.last_response_bytes: int | None = None
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.response_codes: Counter[str] = Counter()
+
+    @property
+    def mean_latency(self) -> float | None:
+        """Return the mean latency in seconds, if any request was sent."""
+        return self.latency_total / self.requests if self.requests else None
+
+    def record_response(self, latency: float, code: str | None) -> None:
+        """Count a response and the MobilityLabs code it carried."""
+        self._record_latency(latency)
+        self.response_codes[str(code)] += 1
+
+    def record_bytes(self, size: int) -> None:
+        """Count the bytes of a response body."""
+        self.bytes_received += size
+        self.last_response_bytes = size
+
+    def record_error(self, latency: float) -> None:
+        """Count a request that got no response."""
+        self._record_latency(latency)
+        self.errors += 1
+
+    def _record_latency(self, latency: float) -> None:
+        """Count a request in the latency histogram."""
+        self.requests += 1
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+        self.latency_buckets[bisect_left(LATENCY_BUCKETS, latency)] += 1
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the metrics in a JSON serializable form."""
+        mean_latency = self.mean_latency
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "bytes_received": self.bytes_received,
+            "last_response_bytes": self.last_response_bytes,
+            "mean_latency_ms": (
+                round(mean_latency * 1000, 1) if mean_latency is not None else None
+            ),
+            "max_latency_ms": round(self.latency_max * 1000, 1),
+            "latency_histogram": {
+                str(bound): count
+                for bound, count in zip(
+                    (*LATENCY_BUCKETS, "inf"), self.latency_buckets
+                )
+            },
+            "response_codes": dict(self.response_codes),
+        }
+
+
+class ParseMetrics:
+    """Count how often a response was parsed and how long it took."""
+
+    def __init__(self) -> None:
+        """Initialize empty metrics."""
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, duration: float) -> None:
+        """Count a parsed response."""
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the metrics in a JSON serializable form."""
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1000, 3) if self.count else None,
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+
+class APIMetrics:
+    """Collect the request and parsing metrics of an API client or account."""
+
+    def __init__(self) -> None:
+        """Initialize empty metrics."""
+        self.endpoints: dict[str, EndpointMetrics] = {}
+        self.parsers: dict[str, ParseMetrics] = {}
+        self.retries: Counter[str] = Counter()
+
+    def endpoint(self, url: str) -> EndpointMetrics:
+        """Return the metrics of the endpoint a URL belongs to."""
+        name = endpoint_name(url)
+        metrics = self.endpoints.get(name)
+        if metrics is None:
+            metrics = self.endpoints[name] = EndpointMetrics()
+        return metrics
+
+    def combined(self) -> EndpointMetrics:
+        """Return the metrics of every endpoint added together."""
+        combined = EndpointMetrics()
+        for metrics in self.endpoints.values():
+            combined.requests += metrics.requests
+            combined.errors += metrics.errors
+            combined.bytes_received += metrics.bytes_received
+            combined.latency_total += metrics.latency_total
+            combined.latency_max = max(combined.latency_max, metrics.latency_max)
+            combined.latency_buckets = [
+                total + count
+                for total, count in zip(combined.latency_buckets, metrics.latency_buckets)
+            ]
+            combined.response_codes.update(metrics.response_codes)
+        return combined
+
+    def record_parse(self, parser: str, duration: float) -> None:
+        """Count a response parsed by a parser."""
+        metrics = self.parsers.get(parser)
+        if metrics is None:
+            metrics = self.parsers[parser] = ParseMetrics()
+        metrics.record(duration)
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the metrics in a JSON serializable form."""
+        return {
+            "endpoints": {
+                name: metrics.as_dict() for name, metrics in self.endpoints.items()
+            },
+            "parsers": {
+                name: metrics.as_dict() for name, metrics in self.parsers.items()
+            },
+            "retries": dict(self.retries),
+        }
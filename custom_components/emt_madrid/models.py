@@ -0,0 +1,188 @@
+"""Data model for EMT Madrid bus stops and BiciMad stations."""
+
+from __future__ import annotations
+
+from collections.abc import Callable, Mapping
+from dataclasses import asdict, dataclass, field
+import math
+from types import MappingProxyType
+from typing import Any
+
+EMPTY_MAPPING: Mapping[Any, Any] = MappingProxyType({})
+
+
+def _empty_mapping() -> Mapping[Any, Any]:
+    """Return the shared empty mapping, as dataclasses refuse it as a default."""
+    return EMPTY_MAPPING
+
+
+def parse_coordinates(value: Any) -> tuple[float, float] | None:
+    """Return ``[longitude, latitude]`` from the API as a tuple."""
+    if not value or len(value) < 2:
+        return None
+    return (value[0], value[1])
+
+
+@dataclass(frozen=True, slots=True)
+class Line:
+    """Static details of a bus line at a stop."""
+
+    destination: str | None = None
+    origin: str | None = None
+    max_freq: int | None = None
+    min_freq: int | None = None
+    start_time: str | None = None
+    end_time: str | None = None
+    day_type: str | None = None
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> Line:
+        """Build a line from its stored representation."""
+        return cls(
+            destination=data.get("destination"),
+            origin=data.get("origin"),
+            max_freq=data.get("max_freq"),
+            min_freq=data.get("min_freq"),
+            start_time=data.get("start_time"),
+            end_time=data.get("end_time"),
+            day_type=data.get("day_type"),
+        )
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the line in a form that can be stored as JSON."""
+        return asdict(self)
+
+
+@dataclass(frozen=True, slots=True)
+class Stop:
+    """Static details of a bus stop and the lines serving it."""
+
+    stop_id: int
+    name: str | None = None
+    coordinates: tuple[float, float] | None = None
+    address: str | None = None
+    lines: Mapping[str, Line] = field(default_factory=_empty_mapping)
+
+    @property
+    def latitude(self) -> float | None:
+        """Return the latitude of the stop."""
+        return self.coordinates[1] if self.coordinates else None
+
+    @property
+    def longitude(self) -> float | None:
+        """Return the longitude of the stop."""
+        return self.coordinates[0] if self.coordinates else None
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> Stop:
+        """Build a stop from its stored representation."""
+        return cls(
+            stop_id=data["bus_stop_id"],
+            name=data.get("bus_stop_name"),
+            coordinates=parse_coordinates(data.get("bus_stop_coordinates")),
+            address=data.get("bus_stop_address"),
+            lines=MappingProxyType(
+                {
+                    line: Line.from_dict(line_info)
+                    for line, line_info in data.get("lines", {}).items()
+                }
+            ),
+        )
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the stop in a form that can be stored as JSON."""
+        return {
+            "bus_stop_id": self.stop_id,
+            "bus_stop_name": self.name,
+            "bus_stop_coordinates": list(self.coordinates) if self.coordinates else None,
+            "bus_stop_address": self.address,
+            "lines": {line: line_info.as_dict() for line, line_info in self.lines.items()},
+        }
+
+
+@dataclass(frozen=True, slots=True)
+class Arrival:
+    """A bus on its way to a stop."""
+
+    estimate: int | None
+    distance: int | None = None
+
+
+def to_minutes(
+    estimates: tuple[int | None, int | None],
+    rounding: Callable[[float], int] = math.trunc,
+) -> tuple[int | None, int | None]:
+    """Round arrival times in seconds to whole minutes, down by default."""
+    return tuple(
+        rounding(estimate / 60) if estimate is not None else None
+        for estimate in estimates
+    )
+
+
+@dataclass(frozen=True, slots=True)
+class LineArrivals:
+    """The buses of a line on their way to a stop, padded for the sensors."""
+
+    arrivals: tuple[Arrival, ...] = ()
+    estimates: tuple[int | None, int | None] = (None, None)
+    minutes: tuple[int | None, int | None] = (None, None)
+    distance: int | None = None
+    has_estimate: bool | None = None
+
+
+NO_ARRIVALS = LineArrivals()
+
+
+@dataclass(frozen=True, slots=True)
+class StopArrivals:
+    """The arrivals of every line at a stop, as fetched at ``updated_at``."""
+
+    lines: Mapping[str, LineArrivals] = field(default_factory=_empty_mapping)
+    updated_at: float | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class Station:
+    """State of a BiciMad station."""
+
+    station_id: int | None
+    number: str | None = None
+    name: str | None = None
+    coordinates: tuple[float, float] | None = None
+    address: str | None = None
+    docked_bikes: int | None = None
+    free_bases: int | None = None
+
+    @property
+    def latitude(self) -> float | None:
+        """Return the latitude of the station."""
+        return self.coordinates[1] if self.coordinates else None
+
+    @property
+    def longitude(self) -> float | None:
+        """Return the longitude of the station."""
+        return self.coordinates[0] if self.coordinates else None
+
+    @classmethod
+    def from_api(cls, data: Mapping[str, Any]) -> Station:
+        """Build a station from an entry of the API response."""
+        return cls(
+            station_id=int(data["id"]),
+            number=data.get("number"),
+            name=data.get("name"),
+            coordinates=parse_coordinates(data.get("geometry", {}).get("coordinates")),
+            address=data.get("address"),
+            docked_bikes=data.get("dock_bikes"),
+            free_bases=data.get("free_bases"),
+        )
+
+    def as_neighbour(self, distance: float) -> dict[str, Any]:
+        """Return the station as seen from another one, a distance in meters away."""
+        return {
+            "station_id": self.station_id,
+            "station_number": self.number,
+            "station_name": self.name,
+            "distance": round(distance),
+            "bikes": self.docked_bikes,
+            "free_bases": self.free_bases,
+        }
@@ -0,0 +1,103 @@
+"""Daily API quota tracking for EMT Madrid MobilityLabs accounts."""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+QUOTA_TIMEZONE = ZoneInfo("Europe/Madrid")
+QUOTA_SAFETY_MARGIN = 0.9
+MAX_POLL_INTERVAL = timedelta(hours=1)
+MIN_POLL_INTERVAL = timedelta(seconds=30)
+# Spare quota may bring a job forward to at most this many times its pace.
+MAX_SPEEDUP = 2
+
+
+class QuotaScheduler:
+    """Spread the daily request quota of an account over its polling jobs."""
+
+    def __init__(self) -> None:
+        """Initialize the scheduler."""
+        self._daily_limit: int | None = None
+        self._calls_today = 0
+        self._day = self._now().date()
+        self._limit_reached = False
+        self._jobs: dict[str, timedelta] = {}
+
+    def register(self, name: str, interval: timedelta) -> None:
+        """Register a polling job and its preferred interval."""
+        self._jobs[name] = interval
+
+    def unregister(self, name: str) -> None:
+        """Stop accounting for a polling job."""
+        self._jobs.pop(name, None)
+
+    def update_counter(self, api_counter: dict | None) -> None:
+        """Synchronize with the apiCounter returned by the login endpoint."""
+        if not api_counter:
+            return
+        self._roll_over()
+        try:
+            self._calls_today = max(self._calls_today, int(api_counter["current"]))
+            self._daily_limit = int(api_counter["dailyUse"])
+        except (KeyError, TypeError, ValueError):
+            return
+
+    def record_call(self) -> None:
+        """Count a request made against the quota."""
+        self._roll_over()
+        self._calls_today += 1
+
+    def record_limit_reached(self) -> None:
+        """Remember that the API refused a request until the quota resets."""
+        self._roll_over()
+        self._limit_reached = True
+
+    @property
+    def calls_today(self) -> int:
+        """Return the number of requests made today."""
+        self._roll_over()
+        return self._calls_today
+
+    @property
+    def daily_limit(self) -> int | None:
+        """Return the daily request quota, if known."""
+        return self._daily_limit
+
+    def get_interval(self, name: str, interval: timedelta) -> timedelta:
+        """Return how long a job should wait so all jobs spread today's quota."""
+        self._roll_over()
+        until_reset = self._until_reset()
+        if self._limit_reached:
+            return until_reset
+        if self._daily_limit is None:
+            return interval
+
+        remaining = self._daily_limit * QUOTA_SAFETY_MARGIN - self._calls_today
+        if remaining <= 0:
+            return min(until_reset, MAX_POLL_INTERVAL)
+        jobs = {**self._jobs, name: interval}
+        demand = sum(until_reset / job_interval for job_interval in jobs.values())
+        shortest = max(interval / MAX_SPEEDUP, min(interval, MIN_POLL_INTERVAL))
+        return min(max(interval * (demand / remaining), shortest), MAX_POLL_INTERVAL)
+
+    def _roll_over(self) -> None:
+        """Reset the counters when the quota day changes."""
+        today = self._now().date()
+        if today != self._day:
+            self._day = today
+            self._calls_today = 0
+            self._limit_reached = False
+
+    def _until_reset(self) -> timedelta:
+        """Return the time left until the quota resets at midnight in Madrid."""
+        now = self._now()
+        midnight = datetime.combine(
+            now.date() + timedelta(days=1), datetime.min.time(), QUOTA_TIMEZONE
+        )
+        return midnight - now
+
+    @staticmethod
+    def _now() -> datetime:
+        """Return the current time in the quota timezone."""
+        return datetime.now(QUOTA_TIMEZONE)
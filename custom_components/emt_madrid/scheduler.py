@@ -0,0 +1,76 @@
+"""Adaptive polling intervals for EMT Madrid bus stops."""
+
+from __future__ import annotations
+
+from collections.abc import Iterable
+from datetime import datetime, time, timedelta
+
+NEAR_ARRIVAL = 5
+NEAR_ARRIVAL_INTERVAL = timedelta(seconds=30)
+DEFAULT_INTERVAL = timedelta(minutes=1)
+NO_ARRIVALS_INTERVAL = timedelta(minutes=2)
+MAX_ARRIVALS_INTERVAL = timedelta(minutes=5)
+MAX_IDLE_INTERVAL = timedelta(hours=1)
+
+# A line's end time is when the last bus leaves the first stop, so it can still
+# be on its way to this stop for a while afterwards.
+SERVICE_END_MARGIN = timedelta(hours=1)
+
+
+def bus_stop_interval(
+    arrivals: Iterable[int | None],
+    service_windows: Iterable[tuple[str | None, str | None]],
+    now: datetime,
+) -> timedelta:
+    """Return how long to wait before polling a stop again.
+
+    ``arrivals`` are the minutes until the next bus of each line and
+    ``service_windows`` the ``(start_time, end_time)`` of each line.
+    """
+    wait = _time_until_service(service_windows, now)
+    if wait > timedelta(0):
+        return min(wait, MAX_IDLE_INTERVAL)
+
+    known = [arrival for arrival in arrivals if arrival is not None]
+    if not known:
+        return NO_ARRIVALS_INTERVAL
+    soonest = min(known)
+    if soonest <= NEAR_ARRIVAL:
+        return NEAR_ARRIVAL_INTERVAL
+    # Poll a few times before the bus arrives, never slower than the cap.
+    return min(max(DEFAULT_INTERVAL, timedelta(minutes=soonest) / 3), MAX_ARRIVALS_INTERVAL)
+
+
+def _time_until_service(
+    service_windows: Iterable[tuple[str | None, str | None]], now: datetime
+) -> timedelta:
+    """Return the time until any line is in service, zero if one already is."""
+    waits: list[timedelta] = []
+    for start_time, end_time in service_windows:
+        start = _parse_time(start_time)
+        end = _parse_time(end_time)
+        if start is None or end is None:
+            return timedelta(0)
+        start_at = datetime.combine(now.date(), start, now.tzinfo)
+        end_at = datetime.combine(now.date(), end, now.tzinfo) + SERVICE_END_MARGIN
+        if end_at - SERVICE_END_MARGIN <= start_at:
+            # The service runs past midnight.
+            end_at += timedelta(days=1)
+        for day in (-1, 0):
+            if start_at + timedelta(days=day) <= now <= end_at + timedelta(days=day):
+                return timedelta(0)
+        if now > start_at:
+            start_at += timedelta(days=1)
+        waits.append(start_at - now)
+    return min(waits, default=timedelta(0))
+
+
+def _parse_time(value: str | None) -> time | None:
+    """Parse an ``HH:MM`` time from the API."""
+    if not value:
+        return None
+    try:
+        hours, minutes = value.split(":")[:2]
+        return time(int(hours) % 24, int(minutes))
+    except ValueError:
+        return None
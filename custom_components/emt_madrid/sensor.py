@@ -2,34 +2,65 @@
 
 from __future__ import annotations
 
-from datetime import timedelta
+from abc import abstractmethod
+from collections.abc import Callable
+from datetime import datetime, timedelta
 import logging
-from typing import Any
+import math
+from typing import Any, TypeVar
 
-from homeassistant.components.sensor import SensorEntity
+from homeassistant.components.sensor import (
+    SensorDeviceClass,
+    SensorEntity,
+    SensorStateClass,
+)
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import (
     ATTR_ATTRIBUTION,
+    EntityCategory,
+    UnitOfLength,
     UnitOfTime,
 )
-from homeassistant.core import HomeAssistant
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
-
-from .bicimad import BicimadEMT
+from homeassistant.helpers.event import async_call_later, async_track_time_interval
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+
+from . import (
+    async_get_bicimad_coordinator,
+    async_get_fetch_engine,
+    async_get_stop_cache,
+    async_get_token_manager,
+    async_set_entry_coordinator,
+)
 from .buses import BusesEMT
 from .const import (
+    ATTR_ARRIVAL_SECONDS,
     ATTR_BIKES,
+    ATTR_BYTES_RECEIVED,
+    ATTR_DATA_AGE,
     ATTR_DESTINATION,
     ATTR_DISTANCE,
     ATTR_END_TIME,
+    ATTR_ERRORS,
     ATTR_FREE_BASES,
+    ATTR_HAS_ESTIMATE,
+    ATTR_LATENCY_HISTOGRAM,
     ATTR_LATITUDE,
     ATTR_LINE,
     ATTR_LONGITUDE,
     ATTR_MAX_FREQ,
+    ATTR_MAX_LATENCY,
     ATTR_MIN_FREQ,
+    ATTR_NEARBY_STATIONS,
     ATTR_NEXT_BUS,
+    ATTR_NEXT_BUS_SECONDS,
+    ATTR_STALE,
     ATTR_ORIGIN,
+    ATTR_PARSE_TIME,
+    ATTR_REQUESTS,
+    ATTR_RESPONSE_CODES,
     ATTR_START_TIME,
     ATTR_STATION_ADDRESS,
     ATTR_STATION_ID,
@@ -41,20 +72,36 @@ from .const import (
     ATTRIBUTION,
     CONF_EMAIL,
     CONF_LINES,
+    CONF_MAX_CONCURRENT_REQUESTS,
+    CONF_MIN_AVAILABLE,
+    CONF_NEARBY_COUNT,
     CONF_PASSWORD,
+    CONF_REQUEST_TIMEOUT,
     CONF_STATION_ID,
     CONF_STOP_ID,
     CONF_SENSOR_TYPE,
+    CONF_STALE_AFTER,
+    DEFAULT_API_ICON,
     DEFAULT_BICIMAD_ICON,
+    DEFAULT_BICIMAD_NEARBY_ICON,
     DEFAULT_BUS_ICON,
+    DEFAULT_MAX_CONCURRENT_REQUESTS,
+    DEFAULT_MIN_AVAILABLE,
+    DEFAULT_NEARBY_COUNT,
+    DEFAULT_REQUEST_TIMEOUT,
+    DEFAULT_STALE_AFTER,
     DOMAIN,
     SENSOR_TYPE_BICIMAD,
     SENSOR_TYPE_BUS,
 )
+from .coordinator import EMTBicimadCoordinator, EMTBusCoordinator, EMTCoordinator
+from .models import Station, Stop, to_minutes
 
 _LOGGER = logging.getLogger(__name__)
 
-SCAN_INTERVAL = timedelta(minutes=1)
+COUNTDOWN_INTERVAL = timedelta(seconds=15)
+
+_CoordinatorT = TypeVar("_CoordinatorT", bound=EMTCoordinator)
 
 
 async def async_setup_entry(
@@ -65,6 +112,10 @@ async def async_setup_entry(
     """Set up EMT Madrid sensors from a config entry."""
     data = entry.data
     sensor_type = data[CONF_SENSOR_TYPE]
+    session = async_get_clientsession(hass)
+    stale_after = timedelta(
+        minutes=entry.options.get(CONF_STALE_AFTER, DEFAULT_STALE_AFTER)
+    )
 
     if sensor_type == SENSOR_TYPE_BUS:
         email = data[CONF_EMAIL]
@@ -72,32 +123,44 @@ async def async_setup_entry(
         stop_id = data[CONF_STOP_ID]
         lines = data.get(CONF_LINES, [])
 
-        buses_emt = BusesEMT(email, password, stop_id)
-
-        await hass.async_add_executor_job(buses_emt.authenticate)
-        await hass.async_add_executor_job(buses_emt.update_stop_info, stop_id)
-
-        stop_info = buses_emt.get_stop_info()
+        request_timeout = entry.options.get(
+            CONF_REQUEST_TIMEOUT, DEFAULT_REQUEST_TIMEOUT
+        )
+        engine = async_get_fetch_engine(hass)
+        engine.async_configure(
+            entry.options.get(
+                CONF_MAX_CONCURRENT_REQUESTS, DEFAULT_MAX_CONCURRENT_REQUESTS
+            ),
+            request_timeout,
+        )
+        token_manager = async_get_token_manager(hass, email, password)
+        buses_emt = BusesEMT(session, email, password, stop_id, token_manager)
+        buses_emt.request_timeout = request_timeout
+        coordinator = EMTBusCoordinator(
+            hass, buses_emt, stop_id, async_get_stop_cache(hass), engine
+        )
+        stop = await coordinator.async_setup_stop()
+        async_set_entry_coordinator(hass, entry, coordinator)
         if not lines:
-            lines = list(stop_info["lines"].keys())
+            lines = list(stop.lines)
 
-        entities: list[EMTBusSensor] = []
+        entities: list[SensorEntity] = []
         for line in lines:
-            if line in stop_info["lines"]:
-                await hass.async_add_executor_job(buses_emt.update_arrival_times, stop_id)
+            if line in stop.lines:
                 entities.append(
                     EMTBusSensor(
-                        buses_emt,
+                        coordinator,
                         entry.entry_id,
-                        stop_id,
                         line,
-                        stop_info.get("bus_stop_name", ""),
+                        stop.name,
+                        stale_after,
                     )
                 )
             else:
                 _LOGGER.error(
                     "Sensor setup failed. Line %s not serviced at stop %s", line, stop_id
                 )
+        entities.append(EMTBusStopAPISensor(coordinator, entry.entry_id, stop.name))
 
         async_add_entities(entities)
 
@@ -106,90 +169,221 @@ async def async_setup_entry(
         password = data[CONF_PASSWORD]
         station_id = data[CONF_STATION_ID]
 
-        bicimad_emt = BicimadEMT(email, password, station_id)
-
-        await hass.async_add_executor_job(bicimad_emt.authenticate)
-        await hass.async_add_executor_job(bicimad_emt.update_station_info, station_id)
+        coordinator = async_get_bicimad_coordinator(hass, email, password)
+        await coordinator.async_ensure_first_refresh()
+        entry.async_on_unload(coordinator.async_shutdown)
+        async_set_entry_coordinator(hass, entry, coordinator)
 
-        station_info = bicimad_emt.get_station_info()
+        station = coordinator.data.get(station_id)
+        if station is None:
+            _LOGGER.warning("BiciMad station %s not found in the network", station_id)
 
+        station_name = station.name if station is not None else ""
+        min_available = entry.options.get(CONF_MIN_AVAILABLE, DEFAULT_MIN_AVAILABLE)
+        nearby_count = entry.options.get(CONF_NEARBY_COUNT, DEFAULT_NEARBY_COUNT)
         async_add_entities(
             [
                 EMTBicimadSensor(
-                    bicimad_emt,
-                    entry.entry_id,
-                    station_id,
-                    station_info.get("station_name", ""),
-                )
+                    coordinator, entry.entry_id, station_id, station_name, stale_after
+                ),
+                *(
+                    EMTBicimadNearbySensor(
+                        coordinator,
+                        entry.entry_id,
+                        station_id,
+                        station_name,
+                        free_bases,
+                        min_available,
+                        nearby_count,
+                        stale_after,
+                    )
+                    for free_bases in (False, True)
+                ),
             ]
         )
 
 
-class EMTBusSensor(SensorEntity):
+class EMTSensor(CoordinatorEntity[_CoordinatorT], SensorEntity):
+    """Base sensor that keeps serving its last data until it gets too old."""
+
+    def __init__(self, coordinator: _CoordinatorT, stale_after: timedelta) -> None:
+        """Initialize the sensor."""
+        super().__init__(coordinator)
+        self._stale_after = stale_after.total_seconds()
+        self._state_attributes: dict[str, Any] = {}
+        self._written_available: bool | None = None
+        self._unsub_expiry: CALLBACK_TYPE | None = None
+
+    @property
+    def available(self) -> bool:
+        """Return if the data is fresh, or has been failing to refresh for a short while."""
+        if super().available:
+            return True
+        data_age = self.coordinator.data_age
+        return data_age is not None and data_age <= self._stale_after
+
+    async def async_update(self) -> None:
+        """Serve the current data at once and refresh it in the background."""
+        if self.enabled:
+            self.coordinator.async_revalidate()
+
+    async def async_will_remove_from_hass(self) -> None:
+        """Stop waiting for the data to expire."""
+        await super().async_will_remove_from_hass()
+        self._cancel_expiry()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Write the state only if the new data or the availability changed it."""
+        self._schedule_expiry()
+        if self._update_attributes() or self.available != self._written_available:
+            self.async_write_ha_state()
+
+    @callback
+    def async_write_ha_state(self) -> None:
+        """Write the state and remember the availability it was written with."""
+        self._written_available = self.available
+        super().async_write_ha_state()
+
+    def _update_attributes(self) -> bool:
+        """Build the state and attributes, returning whether they changed."""
+        native_value, attributes = self._build_state()
+        attributes[ATTR_STALE] = not self.coordinator.last_update_success
+        changed = (
+            native_value != self._attr_native_value
+            or attributes != self._state_attributes
+        )
+        data_age = self.coordinator.data_age
+        self._state_attributes = attributes
+        self._attr_native_value = native_value
+        # The age alone does not make the state worth writing again.
+        self._attr_extra_state_attributes = {
+            **attributes,
+            ATTR_DATA_AGE: round(data_age) if data_age is not None else None,
+        }
+        return changed
+
+    @abstractmethod
+    def _build_state(self) -> tuple[Any, dict[str, Any]]:
+        """Return the native value and attributes from the coordinator data."""
+
+    @callback
+    def _schedule_expiry(self) -> None:
+        """Check the availability again once failing data passes the staleness limit."""
+        self._cancel_expiry()
+        data_age = self.coordinator.data_age
+        if self.hass is None or self.coordinator.last_update_success or data_age is None:
+            return
+        self._unsub_expiry = async_call_later(
+            self.hass, max(self._stale_after - data_age, 0), self._async_expire
+        )
+
+    @callback
+    def _cancel_expiry(self) -> None:
+        """Cancel the pending availability check."""
+        if self._unsub_expiry is not None:
+            self._unsub_expiry()
+            self._unsub_expiry = None
+
+    @callback
+    def _async_expire(self, _now: datetime) -> None:
+        """Mark the sensor unavailable once its data has become too old."""
+        self._unsub_expiry = None
+        if self.available != self._written_available:
+            self._update_attributes()
+            self.async_write_ha_state()
+
+
+class EMTBusSensor(EMTSensor[EMTBusCoordinator]):
     """Implementation of an EMT-Madrid bus line sensor."""
 
     _attr_native_unit_of_measurement = UnitOfTime.MINUTES
     _attr_icon = DEFAULT_BUS_ICON
+    _minutes_rounding: Callable[[float], int] = staticmethod(math.trunc)
 
     def __init__(
         self,
-        buses_emt: BusesEMT,
+        coordinator: EMTBusCoordinator,
         entry_id: str,
-        stop_id: int,
         line: str,
         stop_name: str,
+        stale_after: timedelta = timedelta(minutes=DEFAULT_STALE_AFTER),
     ) -> None:
         """Initialize the sensor."""
-        self._buses_emt = buses_emt
-        self._stop_id = stop_id
+        super().__init__(coordinator, stale_after)
+        self._buses_emt = coordinator.buses_emt
+        self._stop_id = coordinator.stop_id
         self._bus_line = line
         self._stop_name = stop_name
 
         self._attr_name = f"Bus {line} - {stop_name}"
-        self._attr_unique_id = f"{DOMAIN}_bus_{entry_id}_{stop_id}_{line}"
-
-    @property
-    def native_value(self) -> int | None:
-        """Return the state of the sensor."""
-        arrival_time = self._buses_emt.get_arrival_time(self._bus_line)
-        return arrival_time[0]
+        self._attr_unique_id = f"{DOMAIN}_bus_{entry_id}_{self._stop_id}_{line}"
+        self._stop: Stop | None = None
+        self._static_attributes: dict[str, Any] = {}
+        self._countdown = self._buses_emt.get_arrival_countdown(line)
+        self._minutes = to_minutes(self._countdown, self._minutes_rounding)
+        self._update_attributes()
+
+    async def async_added_to_hass(self) -> None:
+        """Count the arrival times down between updates."""
+        await super().async_added_to_hass()
+        self.async_on_remove(
+            async_track_time_interval(
+                self.hass, self._async_update_countdown, COUNTDOWN_INTERVAL
+            )
+        )
 
-    @property
-    def extra_state_attributes(self) -> dict[str, Any]:
-        """Return the device state attributes."""
-        arrival_time = self._buses_emt.get_arrival_time(self._bus_line)
-        stop_info = self._buses_emt.get_stop_info()
-        line_info = self._buses_emt.get_line_info(self._bus_line)
-        coordinates = stop_info.get("bus_stop_coordinates")
-        latitude = coordinates[1] if coordinates and len(coordinates) > 1 else None
-        longitude = coordinates[0] if coordinates else None
-
-        return {
-            ATTR_NEXT_BUS: arrival_time[1],
-            ATTR_LINE: self._bus_line,
-            ATTR_DISTANCE: line_info.get("distance", [None])[0],
-            ATTR_DESTINATION: line_info.get("destination"),
-            ATTR_ORIGIN: line_info.get("origin"),
-            ATTR_START_TIME: line_info.get("start_time"),
-            ATTR_END_TIME: line_info.get("end_time"),
-            ATTR_MAX_FREQ: line_info.get("max_freq"),
-            ATTR_MIN_FREQ: line_info.get("min_freq"),
-            ATTR_STOP_ID: self._stop_id,
-            ATTR_STOP_NAME: stop_info.get("bus_stop_name"),
-            ATTR_STOP_ADDRESS: stop_info.get("bus_stop_address"),
-            ATTR_LATITUDE: latitude,
-            ATTR_LONGITUDE: longitude,
-            ATTR_ATTRIBUTION: ATTRIBUTION,
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Restart the countdown from the new arrival times."""
+        self._countdown = self._buses_emt.get_arrival_countdown(self._bus_line)
+        self._minutes = to_minutes(self._countdown, self._minutes_rounding)
+        super()._handle_coordinator_update()
+
+    @callback
+    def _async_update_countdown(self, _now: datetime) -> None:
+        """Write the state when the counted down minutes change."""
+        self._countdown = self._buses_emt.get_arrival_countdown(self._bus_line)
+        minutes = to_minutes(self._countdown, self._minutes_rounding)
+        if minutes != self._minutes:
+            self._minutes = minutes
+            self._update_attributes()
+            self.async_write_ha_state()
+
+    def _build_state(self) -> tuple[int | None, dict[str, Any]]:
+        """Return the arrival time, reusing the attributes that come from the stop."""
+        stop = self._buses_emt.get_stop_info()
+        if stop is not self._stop:
+            self._stop = stop
+            line_info = self._buses_emt.get_line_info(self._bus_line)
+            self._static_attributes = {
+                ATTR_LINE: self._bus_line,
+                ATTR_DESTINATION: line_info.destination,
+                ATTR_ORIGIN: line_info.origin,
+                ATTR_START_TIME: line_info.start_time,
+                ATTR_END_TIME: line_info.end_time,
+                ATTR_MAX_FREQ: line_info.max_freq,
+                ATTR_MIN_FREQ: line_info.min_freq,
+                ATTR_STOP_ID: self._stop_id,
+                ATTR_STOP_NAME: stop.name,
+                ATTR_STOP_ADDRESS: stop.address,
+                ATTR_LATITUDE: stop.latitude,
+                ATTR_LONGITUDE: stop.longitude,
+                ATTR_ATTRIBUTION: ATTRIBUTION,
+            }
+
+        line_arrivals = self._buses_emt.get_line_arrivals(self._bus_line)
+        return self._minutes[0], {
+            ATTR_NEXT_BUS: self._minutes[1],
+            ATTR_ARRIVAL_SECONDS: self._countdown[0],
+            ATTR_NEXT_BUS_SECONDS: self._countdown[1],
+            ATTR_HAS_ESTIMATE: line_arrivals.has_estimate,
+            ATTR_DISTANCE: line_arrivals.distance,
+            **self._static_attributes,
         }
 
-    async def async_update(self) -> None:
-        """Fetch new state data for the sensor."""
-        await self.hass.async_add_executor_job(
-            self._buses_emt.update_arrival_times, self._stop_id
-        )
 
-
-class EMTBicimadSensor(SensorEntity):
+class EMTBicimadSensor(EMTSensor[EMTBicimadCoordinator]):
     """Implementation of an EMT-Madrid BiciMad station sensor."""
 
     _attr_icon = DEFAULT_BICIMAD_ICON
@@ -197,46 +391,141 @@ class EMTBicimadSensor(SensorEntity):
 
     def __init__(
         self,
-        bicimad_emt: BicimadEMT,
+        coordinator: EMTBicimadCoordinator,
         entry_id: str,
         station_id: int,
         station_name: str,
+        stale_after: timedelta = timedelta(minutes=DEFAULT_STALE_AFTER),
     ) -> None:
         """Initialize the sensor."""
-        self._bicimad_emt = bicimad_emt
+        super().__init__(coordinator, stale_after)
         self._station_id = station_id
         self._station_name = station_name
 
         self._attr_name = f"Bicimad {station_name}"
         self._attr_unique_id = f"{DOMAIN}_bicimad_{entry_id}_{station_id}"
+        self._update_attributes()
 
     @property
-    def native_value(self) -> int | None:
-        """Return the number of available bikes."""
-        return self._bicimad_emt.get_docked_bikes()
+    def available(self) -> bool:
+        """Return if the station is present in the latest network snapshot."""
+        return super().available and self._station_id in self.coordinator.data
+
+    def _build_state(self) -> tuple[int | None, dict[str, Any]]:
+        """Return the docked bikes and the attributes of the station."""
+        station = self.coordinator.data.get(self._station_id) or Station(self._station_id)
+        return station.docked_bikes, {
+            ATTR_STATION_ID: self._station_id,
+            ATTR_STATION_NUMBER: station.number,
+            ATTR_STATION_NAME: station.name,
+            ATTR_LATITUDE: station.latitude,
+            ATTR_LONGITUDE: station.longitude,
+            ATTR_STATION_ADDRESS: station.address,
+            ATTR_FREE_BASES: station.free_bases,
+            ATTR_BIKES: station.docked_bikes,
+            ATTR_ATTRIBUTION: ATTRIBUTION,
+        }
+
+
+class EMTBicimadNearbySensor(EMTSensor[EMTBicimadCoordinator]):
+    """Sensor with the closest stations to a BiciMad station with bikes or free bases."""
+
+    _attr_icon = DEFAULT_BICIMAD_NEARBY_ICON
+    _attr_device_class = SensorDeviceClass.DISTANCE
+    _attr_native_unit_of_measurement = UnitOfLength.METERS
+    _attr_entity_registry_enabled_default = False
+
+    def __init__(
+        self,
+        coordinator: EMTBicimadCoordinator,
+        entry_id: str,
+        station_id: int,
+        station_name: str,
+        free_bases: bool,
+        min_available: int = DEFAULT_MIN_AVAILABLE,
+        count: int = DEFAULT_NEARBY_COUNT,
+        stale_after: timedelta = timedelta(minutes=DEFAULT_STALE_AFTER),
+    ) -> None:
+        """Initialize the sensor."""
+        super().__init__(coordinator, stale_after)
+        self._station_id = station_id
+        self._count = count
+        self._min_bikes = 0 if free_bases else min_available
+        self._min_free_bases = min_available if free_bases else 0
+
+        kind = "free_bases" if free_bases else "bikes"
+        self._attr_name = f"Bicimad {station_name} nearest {kind.replace('_', ' ')}"
+        self._attr_unique_id = f"{DOMAIN}_bicimad_{entry_id}_{station_id}_nearest_{kind}"
+        self._update_attributes()
 
     @property
-    def extra_state_attributes(self) -> dict[str, Any]:
-        """Return the device state attributes."""
-        station_info = self._bicimad_emt.get_station_info()
-        coordinates = station_info.get("station_coordinates")
-        latitude = coordinates[1] if coordinates and len(coordinates) > 1 else None
-        longitude = coordinates[0] if coordinates else None
-
-        return {
+    def available(self) -> bool:
+        """Return if the station is present in the latest network snapshot."""
+        return super().available and self._station_id in self.coordinator.data
+
+    def _build_state(self) -> tuple[int | None, dict[str, Any]]:
+        """Return the distance to the closest station and the stations found."""
+        nearby = self.coordinator.nearest_available(
+            self._station_id, self._count, self._min_bikes, self._min_free_bases
+        )
+        return round(nearby[0][0]) if nearby else None, {
             ATTR_STATION_ID: self._station_id,
-            ATTR_STATION_NUMBER: station_info.get("station_number"),
-            ATTR_STATION_NAME: station_info.get("station_name"),
-            ATTR_LATITUDE: latitude,
-            ATTR_LONGITUDE: longitude,
-            ATTR_STATION_ADDRESS: station_info.get("station_address"),
-            ATTR_FREE_BASES: station_info.get("free_bases"),
-            ATTR_BIKES: self._bicimad_emt.get_docked_bikes(),
+            ATTR_NEARBY_STATIONS: [
+                station.as_neighbour(meters) for meters, station in nearby
+            ],
             ATTR_ATTRIBUTION: ATTRIBUTION,
         }
 
-    async def async_update(self) -> None:
-        """Fetch new state data for the sensor."""
-        await self.hass.async_add_executor_job(
-            self._bicimad_emt.update_station_info, self._station_id
+
+class EMTBusStopAPISensor(CoordinatorEntity[EMTBusCoordinator], SensorEntity):
+    """Diagnostic sensor with the cost of the API requests of a bus stop."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_device_class = SensorDeviceClass.DURATION
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_native_unit_of_measurement = UnitOfTime.MILLISECONDS
+    _attr_icon = DEFAULT_API_ICON
+
+    def __init__(
+        self, coordinator: EMTBusCoordinator, entry_id: str, stop_name: str
+    ) -> None:
+        """Initialize the sensor."""
+        super().__init__(coordinator)
+        self._metrics = coordinator.buses_emt.metrics
+        stop_id = coordinator.stop_id
+
+        self._attr_name = f"Bus stop {stop_name} API latency"
+        self._attr_unique_id = f"{DOMAIN}_bus_{entry_id}_{stop_id}_api_latency"
+        self._update_attributes()
+
+    @property
+    def available(self) -> bool:
+        """Return True, the requests are measured even when they fail."""
+        return True
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Update the metrics after every refresh."""
+        self._update_attributes()
+        super()._handle_coordinator_update()
+
+    def _update_attributes(self) -> None:
+        """Build the state and attributes from the request metrics of the stop."""
+        combined = self._metrics.combined()
+        mean_latency = combined.mean_latency
+        self._attr_native_value = (
+            round(mean_latency * 1000, 1) if mean_latency is not None else None
         )
+        metrics = combined.as_dict()
+        self._attr_extra_state_attributes = {
+            ATTR_REQUESTS: metrics["requests"],
+            ATTR_ERRORS: metrics["errors"],
+            ATTR_BYTES_RECEIVED: metrics["bytes_received"],
+            ATTR_MAX_LATENCY: metrics["max_latency_ms"],
+            ATTR_LATENCY_HISTOGRAM: metrics["latency_histogram"],
+            ATTR_RESPONSE_CODES: metrics["response_codes"],
+            ATTR_PARSE_TIME: {
+                parser: parse.as_dict()["mean_ms"]
+                for parser, parse in self._metrics.parsers.items()
+            },
+        }
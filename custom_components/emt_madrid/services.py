@@ -0,0 +1,184 @@
+"""Services of the EMT Madrid integration."""
+
+from __future__ import annotations
+
+from typing import Any
+
+import voluptuous as vol
+
+from homeassistant.const import ATTR_LATITUDE, ATTR_LONGITUDE
+from homeassistant.core import (
+    HomeAssistant,
+    ServiceCall,
+    ServiceResponse,
+    SupportsResponse,
+    callback,
+)
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+
+from . import async_get_station_catalog, async_get_stop_catalog
+from .cache import EMTCatalog
+from .const import (
+    ATTR_INCLUDE_BICIMAD,
+    ATTR_INCLUDE_BUS,
+    ATTR_LIMIT,
+    ATTR_MIN_BIKES,
+    ATTR_MIN_FREE_BASES,
+    ATTR_RADIUS,
+    ATTR_STATION_ID,
+    DATA_BICIMAD_COORDINATORS,
+    DATA_TOKEN_MANAGERS,
+    DEFAULT_CLOSEST_LIMIT,
+    DEFAULT_CLOSEST_RADIUS,
+    DEFAULT_NEARBY_COUNT,
+    DOMAIN,
+    SERVICE_CLOSEST_STOPS,
+    SERVICE_NEAREST_STATIONS,
+)
+from .coordinator import EMTBicimadCoordinator
+from .emt_madrid import APIEMT
+
+CLOSEST_STOPS_SCHEMA = vol.Schema(
+    {
+        vol.Inclusive(ATTR_LATITUDE, "coordinates"): cv.latitude,
+        vol.Inclusive(ATTR_LONGITUDE, "coordinates"): cv.longitude,
+        vol.Optional(ATTR_RADIUS, default=DEFAULT_CLOSEST_RADIUS): vol.All(
+            vol.Coerce(float), vol.Range(min=1, max=10000)
+        ),
+        vol.Optional(ATTR_LIMIT, default=DEFAULT_CLOSEST_LIMIT): vol.All(
+            vol.Coerce(int), vol.Range(min=1, max=100)
+        ),
+        vol.Optional(ATTR_INCLUDE_BUS, default=True): cv.boolean,
+        vol.Optional(ATTR_INCLUDE_BICIMAD, default=True): cv.boolean,
+    }
+)
+
+NEAREST_STATIONS_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_STATION_ID): cv.positive_int,
+        vol.Optional(ATTR_LIMIT, default=DEFAULT_NEARBY_COUNT): vol.All(
+            vol.Coerce(int), vol.Range(min=1, max=30)
+        ),
+        vol.Optional(ATTR_MIN_BIKES, default=0): vol.All(
+            vol.Coerce(int), vol.Range(min=0)
+        ),
+        vol.Optional(ATTR_MIN_FREE_BASES, default=0): vol.All(
+            vol.Coerce(int), vol.Range(min=0)
+        ),
+    }
+)
+
+
+@callback
+def _async_get_api(hass: HomeAssistant) -> APIEMT:
+    """Return the shared client of any account set up in the integration."""
+    managers = hass.data.get(DOMAIN, {}).get(DATA_TOKEN_MANAGERS, {})
+    for manager in managers.values():
+        return manager.get_client(async_get_clientsession(hass))
+    raise HomeAssistantError("Set up an EMT Madrid stop or station first")
+
+
+@callback
+def _async_get_bicimad_coordinator(
+    hass: HomeAssistant, station_id: int
+) -> EMTBicimadCoordinator:
+    """Return a BiciMad coordinator whose network snapshot has a station."""
+    coordinators = hass.data.get(DOMAIN, {}).get(DATA_BICIMAD_COORDINATORS, {})
+    for coordinator in coordinators.values():
+        if coordinator.data and station_id in coordinator.data:
+            return coordinator
+    raise HomeAssistantError(
+        f"BiciMad station {station_id} is not in the network of any set up station"
+    )
+
+
+async def _async_closest(
+    catalog: EMTCatalog,
+    api: APIEMT,
+    latitude: float,
+    longitude: float,
+    limit: int,
+    radius: float,
+) -> list[tuple[float, dict]]:
+    """Return the catalogued items closest to a point, fetching them if needed."""
+    await catalog.async_update(api)
+    return catalog.index.nearest(latitude, longitude, limit, radius)
+
+
+@callback
+def async_setup_services(hass: HomeAssistant) -> None:
+    """Register the services of the integration."""
+
+    async def async_closest_stops(call: ServiceCall) -> ServiceResponse:
+        """Return the bus stops and BiciMad stations closest to a point."""
+        latitude = call.data.get(ATTR_LATITUDE, hass.config.latitude)
+        longitude = call.data.get(ATTR_LONGITUDE, hass.config.longitude)
+        limit = call.data[ATTR_LIMIT]
+        radius = call.data[ATTR_RADIUS]
+        api = _async_get_api(hass)
+
+        response: dict[str, Any] = {}
+        if call.data[ATTR_INCLUDE_BUS]:
+            response["stops"] = [
+                {
+                    "stop_id": stop["id"],
+                    "name": stop["name"],
+                    "lines": stop["lines"],
+                    "distance": round(meters),
+                }
+                for meters, stop in await _async_closest(
+                    async_get_stop_catalog(hass), api, latitude, longitude, limit, radius
+                )
+            ]
+        if call.data[ATTR_INCLUDE_BICIMAD]:
+            response["stations"] = [
+                {
+                    "station_id": station["id"],
+                    "number": station["number"],
+                    "name": station["name"],
+                    "address": station["address"],
+                    "distance": round(meters),
+                }
+                for meters, station in await _async_closest(
+                    async_get_station_catalog(hass),
+                    api,
+                    latitude,
+                    longitude,
+                    limit,
+                    radius,
+                )
+            ]
+        return response
+
+    async def async_nearest_stations(call: ServiceCall) -> ServiceResponse:
+        """Return the stations closest to a station with enough bikes or free bases."""
+        station_id = call.data[ATTR_STATION_ID]
+        coordinator = _async_get_bicimad_coordinator(hass, station_id)
+        return {
+            "stations": [
+                station.as_neighbour(meters)
+                for meters, station in coordinator.nearest_available(
+                    station_id,
+                    call.data[ATTR_LIMIT],
+                    call.data[ATTR_MIN_BIKES],
+                    call.data[ATTR_MIN_FREE_BASES],
+                )
+            ]
+        }
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_CLOSEST_STOPS,
+        async_closest_stops,
+        schema=CLOSEST_STOPS_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_NEAREST_STATIONS,
+        async_nearest_stations,
+        schema=NEAREST_STATIONS_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
@@ -0,0 +1,169 @@
+"""Grid index to find EMT Madrid stops and stations by distance."""
+
+from __future__ import annotations
+
+from collections.abc import Iterable, Mapping
+import math
+from typing import Generic, TypeVar
+
+_K = TypeVar("_K")
+_T = TypeVar("_T")
+
+EARTH_RADIUS = 6_371_008.8
+METERS_PER_DEGREE = EARTH_RADIUS * math.pi / 180
+DEFAULT_CELL_SIZE = 250
+NEIGHBOUR_COUNT = 30
+NEIGHBOUR_RADIUS = 3000
+
+
+def distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Return the great-circle distance in meters between two points."""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    a = (
+        math.sin((phi2 - phi1) / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS * math.asin(math.sqrt(a))
+
+
+class GridIndex(Generic[_T]):
+    """Find the items around a point by looking only at the nearby grid cells."""
+
+    def __init__(
+        self,
+        items: Iterable[tuple[float, float, _T]],
+        cell_size: float = DEFAULT_CELL_SIZE,
+    ) -> None:
+        """Index items given as latitude, longitude and value."""
+        points = list(items)
+        reference_lat = (
+            sum(lat for lat, _, _ in points) / len(points) if points else 40.4
+        )
+        self._cell_size = cell_size
+        self._reference_cos = math.cos(math.radians(reference_lat))
+        self._lat_step = cell_size / METERS_PER_DEGREE
+        self._lon_step = cell_size / (METERS_PER_DEGREE * self._reference_cos)
+        self._cells: dict[tuple[int, int], list[tuple[float, float, _T]]] = {}
+        for point in points:
+            self._cells.setdefault(self._cell(point[0], point[1]), []).append(point)
+        self._size = len(points)
+        rows = [row for row, _ in self._cells] or [0]
+        cols = [col for _, col in self._cells] or [0]
+        self._bounds = (min(rows), max(rows), min(cols), max(cols))
+
+    def __len__(self) -> int:
+        """Return the number of indexed items."""
+        return self._size
+
+    def _cell(self, latitude: float, longitude: float) -> tuple[int, int]:
+        """Return the grid cell of a point."""
+        return (
+            math.floor(latitude / self._lat_step),
+            math.floor(longitude / self._lon_step),
+        )
+
+    def within(
+        self, latitude: float, longitude: float, radius: float
+    ) -> list[tuple[float, _T]]:
+        """Return the items within a radius in meters, closest first."""
+        lat_span = radius / METERS_PER_DEGREE
+        lon_span = radius / (
+            METERS_PER_DEGREE * max(math.cos(math.radians(latitude)), 1e-6)
+        )
+        row_min, col_min = self._cell(latitude - lat_span, longitude - lon_span)
+        row_max, col_max = self._cell(latitude + lat_span, longitude + lon_span)
+        found = []
+        for row in range(row_min, row_max + 1):
+            for col in range(col_min, col_max + 1):
+                for lat, lon, value in self._cells.get((row, col), ()):
+                    meters = distance(latitude, longitude, lat, lon)
+                    if meters <= radius:
+                        found.append((meters, value))
+        found.sort(key=lambda match: match[0])
+        return found
+
+    def nearest(
+        self, latitude: float, longitude: float, limit: int, radius: float | None = None
+    ) -> list[tuple[float, _T]]:
+        """Return up to ``limit`` items closest to a point, optionally within a radius."""
+        if not self._cells:
+            return []
+        center_row, center_col = self._cell(latitude, longitude)
+        row_min, row_max, col_min, col_max = self._bounds
+        last_ring = max(
+            abs(center_row - row_min),
+            abs(center_row - row_max),
+            abs(center_col - col_min),
+            abs(center_col - col_max),
+        )
+        # Cells are narrower in meters north of the latitude they were sized for.
+        cell_width = self._cell_size * min(
+            1, math.cos(math.radians(latitude)) / self._reference_cos
+        )
+        found: list[tuple[float, _T]] = []
+        for ring in range(last_ring + 1):
+            # Only the cells of the ring that hold any item are looked at.
+            for row in range(
+                max(center_row - ring, row_min), min(center_row + ring, row_max) + 1
+            ):
+                if row in (center_row - ring, center_row + ring):
+                    cols = range(
+                        max(center_col - ring, col_min),
+                        min(center_col + ring, col_max) + 1,
+                    )
+                else:
+                    cols = (center_col - ring, center_col + ring)
+                for col in cols:
+                    for lat, lon, value in self._cells.get((row, col), ()):
+                        found.append((distance(latitude, longitude, lat, lon), value))
+            # Every item closer than the rings searched so far has been found.
+            covered = ring * cell_width
+            if radius is not None and covered >= radius:
+                break
+            if len(found) >= limit:
+                found.sort(key=lambda match: match[0])
+                if found[limit - 1][0] <= covered:
+                    break
+        found.sort(key=lambda match: match[0])
+        if radius is not None:
+            found = [match for match in found if match[0] <= radius]
+        return found[:limit]
+
+
+class NeighbourTable(Generic[_K]):
+    """Remember the points closest to each point once they have been looked up."""
+
+    def __init__(
+        self,
+        points: Mapping[_K, tuple[float, float]],
+        count: int = NEIGHBOUR_COUNT,
+        radius: float = NEIGHBOUR_RADIUS,
+    ) -> None:
+        """Index points given by key as latitude and longitude."""
+        self.points = dict(points)
+        self._count = count
+        self._radius = radius
+        self._index: GridIndex[_K] = GridIndex(
+            (lat, lon, key) for key, (lat, lon) in self.points.items()
+        )
+        self._neighbours: dict[_K, list[tuple[float, _K]]] = {}
+        self._counts: dict[_K, int] = {}
+
+    def neighbours(self, key: _K, count: int | None = None) -> list[tuple[float, _K]]:
+        """Return up to ``count`` points closest to a point, itself first."""
+        if count is None:
+            count = self._count
+        neighbours = self._neighbours.get(key)
+        # A shorter list than asked for already holds every point in the radius.
+        if neighbours is None or (
+            len(neighbours) < count and len(neighbours) == self._counts[key]
+        ):
+            if key not in self.points:
+                return []
+            lat, lon = self.points[key]
+            searched = self._counts[key] = max(count, self._count)
+            neighbours = self._neighbours[key] = self._index.nearest(
+                lat, lon, searched, self._radius
+            )
+        return neighbours if len(neighbours) <= count else neighbours[:count]
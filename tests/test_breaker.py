@@ -0,0 +1,52 @@
+"""Tests for the EMT Madrid API circuit breaker."""
+
+from unittest.mock import patch
+
+from custom_components.emt_madrid.breaker import (
+    BASE_BACKOFF,
+    FAILURE_THRESHOLD,
+    CircuitBreaker,
+)
+
+
+def test_breaker_opens_after_repeated_failures() -> None:
+    """Test requests are held back once the host failed too many times in a row."""
+    breaker = CircuitBreaker()
+    with patch("custom_components.emt_madrid.breaker.time.monotonic", return_value=0):
+        for _ in range(FAILURE_THRESHOLD - 1):
+            breaker.record_failure()
+        assert breaker.allow_request()
+
+        breaker.record_failure()
+
+        assert breaker.is_open
+        assert not breaker.allow_request()
+        assert BASE_BACKOFF / 2 <= breaker.retry_in() <= BASE_BACKOFF
+
+
+def test_breaker_backs_off_until_a_trial_succeeds() -> None:
+    """Test a single trial request is let through and failures double the delay."""
+    breaker = CircuitBreaker()
+    with patch(
+        "custom_components.emt_madrid.breaker.time.monotonic", return_value=0
+    ), patch("custom_components.emt_madrid.breaker.random.uniform", return_value=1):
+        for _ in range(FAILURE_THRESHOLD):
+            breaker.record_failure()
+
+    with patch(
+        "custom_components.emt_madrid.breaker.time.monotonic", return_value=BASE_BACKOFF
+    ), patch("custom_components.emt_madrid.breaker.random.uniform", return_value=1):
+        assert breaker.allow_request()
+        assert not breaker.allow_request()
+        breaker.record_failure()
+        assert breaker.retry_in() == BASE_BACKOFF * 2
+
+    with patch(
+        "custom_components.emt_madrid.breaker.time.monotonic",
+        return_value=BASE_BACKOFF * 3,
+    ):
+        assert breaker.allow_request()
+        breaker.record_success()
+
+    assert not breaker.is_open
+    assert breaker.allow_request()
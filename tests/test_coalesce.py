@@ -0,0 +1,82 @@
+"""Tests for the EMT Madrid request coalescing."""
+
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+from custom_components.emt_madrid.coalesce import RequestCoalescer
+
+
+async def test_concurrent_identical_requests_are_sent_once() -> None:
+    """Test callers asking for the same request share one response."""
+    coalescer = RequestCoalescer()
+    started = asyncio.Event()
+    release = asyncio.Event()
+    calls = 0
+
+    async def _request() -> dict:
+        nonlocal calls
+        calls += 1
+        started.set()
+        await release.wait()
+        return {"code": "00"}
+
+    first = asyncio.ensure_future(coalescer.async_request("arrives/72", _request))
+    await started.wait()
+    second = asyncio.ensure_future(coalescer.async_request("arrives/72", _request))
+    release.set()
+
+    assert await first == await second == {"code": "00"}
+    assert calls == 1
+    assert coalescer.stats()["shared"] == 1
+
+
+async def test_responses_reused_only_while_fresh() -> None:
+    """Test a response is reused for a short while and per request key."""
+    coalescer = RequestCoalescer()
+    request = AsyncMock(return_value={"code": "00"})
+
+    with patch(
+        "custom_components.emt_madrid.coalesce.time.monotonic", return_value=100.0
+    ):
+        await coalescer.async_request("arrives/72", request)
+        await coalescer.async_request("arrives/72", request)
+        assert request.await_count == 1
+
+        await coalescer.async_request("arrives/73", request)
+        assert request.await_count == 2
+        assert coalescer.stats() == {
+            "sent": 2,
+            "shared": 0,
+            "cache_hits": 1,
+            "hit_ratio": 0.333,
+        }
+
+    with patch(
+        "custom_components.emt_madrid.coalesce.time.monotonic", return_value=110.0
+    ):
+        await coalescer.async_request("arrives/72", request)
+    assert request.await_count == 3
+
+
+async def test_error_responses_are_not_reused() -> None:
+    """Test an error response reaches the callers sharing it but no later caller."""
+    coalescer = RequestCoalescer()
+    started = asyncio.Event()
+    release = asyncio.Event()
+    responses = [{"code": "98"}, {"code": "00"}]
+
+    async def _request() -> dict:
+        started.set()
+        await release.wait()
+        return responses.pop(0)
+
+    first = asyncio.ensure_future(coalescer.async_request("stations", _request))
+    await started.wait()
+    second = asyncio.ensure_future(coalescer.async_request("stations", _request))
+    release.set()
+
+    assert await first == await second == {"code": "98"}
+    assert await coalescer.async_request("stations", _request) == {"code": "00"}
+    assert await coalescer.async_request("stations", _request) == {"code": "00"}
+    assert coalescer.stats()["sent"] == 2
+    assert coalescer.stats()["cache_hits"] == 1
@@ -0,0 +1,86 @@
+"""Tests for the EMT Madrid batched stop polling."""
+
+import asyncio
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+from homeassistant.core import HomeAssistant
+
+from custom_components.emt_madrid.engine import EMTFetchEngine
+
+
+async def test_cycle_refreshes_due_stops_together(hass: HomeAssistant) -> None:
+    """Test a cycle refreshes every due stop and leaves the others alone."""
+    engine = EMTFetchEngine(hass)
+    now = hass.loop.time()
+    due = [
+        Mock(next_refresh=now - 1, polling_disabled=False, async_refresh=AsyncMock())
+        for _ in range(3)
+    ]
+    later = Mock(next_refresh=now + 60, polling_disabled=False, async_refresh=AsyncMock())
+    idle = Mock(next_refresh=None, polling_disabled=False, async_refresh=AsyncMock())
+    disabled = Mock(next_refresh=now - 1, polling_disabled=True, async_refresh=AsyncMock())
+    removers = [
+        engine.async_add(coordinator)
+        for coordinator in [*due, later, idle, disabled]
+    ]
+
+    await engine._async_run_cycle()
+
+    for coordinator in due:
+        coordinator.async_refresh.assert_awaited_once()
+        assert coordinator.next_refresh is None
+    later.async_refresh.assert_not_awaited()
+    idle.async_refresh.assert_not_awaited()
+    disabled.async_refresh.assert_not_awaited()
+
+    for remove in removers:
+        remove()
+    assert engine._unsub_cycle is None
+
+
+async def test_fetch_limits_concurrency_and_time(hass: HomeAssistant) -> None:
+    """Test requests wait for a free slot and are abandoned after the timeout."""
+    engine = EMTFetchEngine(hass, max_concurrent_requests=2, request_timeout=0.05)
+    running = 0
+    peak = 0
+
+    async def _request() -> int:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return 1
+
+    results = await asyncio.gather(*(engine.async_fetch(_request) for _ in range(5)))
+
+    assert results == [1] * 5
+    assert peak == 2
+
+    with pytest.raises(TimeoutError):
+        await engine.async_fetch(lambda: asyncio.sleep(1))
+
+
+async def test_configure_changes_concurrency_and_time(hass: HomeAssistant) -> None:
+    """Test the options change the concurrency and the timeout of the fetches."""
+    engine = EMTFetchEngine(hass)
+    engine.async_configure(max_concurrent_requests=1, request_timeout=0.05)
+    running = 0
+    peak = 0
+
+    async def _request() -> int:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return 1
+
+    await asyncio.gather(*(engine.async_fetch(_request) for _ in range(3)))
+
+    assert peak == 1
+
+    with pytest.raises(TimeoutError):
+        await engine.async_fetch(lambda: asyncio.sleep(1))
@@ -0,0 +1,43 @@
+"""Tests for the EMT Madrid API metrics."""
+
+from custom_components.emt_madrid.metrics import APIMetrics, endpoint_name
+
+
+def test_endpoint_name_leaves_out_ids() -> None:
+    """Test requests to different stops are counted under the same endpoint."""
+    assert (
+        endpoint_name("https://openapi.emtmadrid.es/v3/transport/busemtmad/stops/72/arrives/")
+        == "/v3/transport/busemtmad/stops/{id}/arrives/"
+    )
+    assert (
+        endpoint_name("https://openapi.emtmadrid.es/v3/transport/bicimad/stations/2139")
+        == "/v3/transport/bicimad/stations/{id}"
+    )
+
+
+def test_metrics_count_latency_codes_and_parse_time() -> None:
+    """Test responses land in the histogram and are added up over endpoints."""
+    metrics = APIMetrics()
+    arrives = metrics.endpoint("https://host/v3/transport/busemtmad/stops/72/arrives/")
+    arrives.record_response(0.05, "00")
+    arrives.record_response(0.3, "80")
+    arrives.bytes_received += 512
+    metrics.endpoint("https://host/v3/mobilitylabs/user/login/").record_error(12.0)
+    metrics.record_parse("arrivals", 0.002)
+
+    combined = metrics.combined()
+    assert combined.requests == 3
+    assert combined.errors == 1
+    assert combined.bytes_received == 512
+    assert combined.response_codes == {"00": 1, "80": 1}
+
+    data = metrics.as_dict()
+    histogram = data["endpoints"]["/v3/transport/busemtmad/stops/{id}/arrives/"][
+        "latency_histogram"
+    ]
+    assert histogram["0.1"] == 1
+    assert histogram["0.5"] == 1
+    assert data["endpoints"]["/v3/mobilitylabs/user/login/"]["latency_histogram"][
+        "inf"
+    ] == 1
+    assert data["parsers"]["arrivals"] == {"count": 1, "mean_ms": 2.0, "max_ms": 2.0}
@@ -0,0 +1,58 @@
+"""Tests for the EMT Madrid API quota scheduler."""
+
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from custom_components.emt_madrid.quota import QUOTA_TIMEZONE, QuotaScheduler
+
+NOON = datetime(2024, 1, 1, 12, 0, tzinfo=QUOTA_TIMEZONE)
+
+
+def test_interval_shortened_with_spare_quota() -> None:
+    """Test jobs poll sooner while the daily quota has room, up to twice as often."""
+    with patch.object(QuotaScheduler, "_now", return_value=NOON):
+        scheduler = QuotaScheduler()
+        scheduler.update_counter({"current": 0, "dailyUse": 1200})
+        scheduler.register("stop_72", timedelta(minutes=10))
+
+        # Polling every 10 minutes for 12 hours needs 72 calls, 1080 are left.
+        assert scheduler.get_interval("stop_72", timedelta(minutes=10)) == timedelta(
+            minutes=5
+        )
+        # Polling every minute needs 720 calls, spread over 1080 every 40 seconds.
+        assert scheduler.get_interval("stop_72", timedelta(minutes=1)) == timedelta(
+            seconds=40
+        )
+
+
+def test_interval_stretched_to_fit_quota() -> None:
+    """Test jobs slow down so the whole fleet fits in the remaining quota."""
+    with patch.object(QuotaScheduler, "_now", return_value=NOON):
+        scheduler = QuotaScheduler()
+        scheduler.update_counter({"current": 100, "dailyUse": 1000})
+        for stop in range(4):
+            scheduler.register(f"stop_{stop}", timedelta(minutes=1))
+
+        interval = scheduler.get_interval("stop_0", timedelta(minutes=1))
+
+    # 4 jobs polling every minute for 12 hours need 2880 calls, 800 are left.
+    assert interval == timedelta(minutes=1) * (2880 / 800)
+
+
+def test_limit_reached_waits_for_reset() -> None:
+    """Test a code 98 pauses polling until the quota resets at midnight."""
+    with patch.object(QuotaScheduler, "_now", return_value=NOON):
+        scheduler = QuotaScheduler()
+        scheduler.record_limit_reached()
+
+        assert scheduler.get_interval("stop_72", timedelta(minutes=1)) == timedelta(
+            hours=12
+        )
+
+    with patch.object(
+        QuotaScheduler, "_now", return_value=NOON + timedelta(hours=12, minutes=1)
+    ):
+        assert scheduler.get_interval("stop_72", timedelta(minutes=1)) == timedelta(
+            minutes=1
+        )
+        assert scheduler.calls_today == 0
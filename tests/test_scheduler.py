@@ -0,0 +1,48 @@
+"""Tests for the EMT Madrid adaptive bus polling."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from custom_components.emt_madrid.scheduler import bus_stop_interval
+
+LINE_27 = ("07:00", "00:01")
+LINE_5 = ("07:00", "22:58")
+
+
+@pytest.mark.parametrize(
+    ("arrivals", "expected"),
+    [
+        ([3, 25], timedelta(seconds=30)),
+        ([12, 25], timedelta(minutes=4)),
+        ([45, None], timedelta(minutes=5)),
+        ([None, None], timedelta(minutes=2)),
+    ],
+)
+def test_interval_follows_next_arrival(
+    arrivals: list[int | None], expected: timedelta
+) -> None:
+    """Test the stop is polled more often the closer the next bus is."""
+    now = datetime(2024, 1, 1, 12, 0)
+
+    assert bus_stop_interval(arrivals, [LINE_27, LINE_5], now) == expected
+
+
+@pytest.mark.parametrize(
+    ("now", "expected"),
+    [
+        (datetime(2024, 1, 1, 0, 30), timedelta(seconds=30)),
+        (datetime(2024, 1, 1, 3, 0), timedelta(hours=1)),
+        (datetime(2024, 1, 1, 6, 40), timedelta(minutes=20)),
+    ],
+)
+def test_interval_idles_outside_service(now: datetime, expected: timedelta) -> None:
+    """Test the stop is left alone until the first line starts its service."""
+    assert bus_stop_interval([3, 3], [LINE_27, LINE_5], now) == expected
+
+
+def test_interval_without_service_times() -> None:
+    """Test lines without a known service window are always polled."""
+    now = datetime(2024, 1, 1, 3, 0)
+
+    assert bus_stop_interval([3], [(None, None)], now) == timedelta(seconds=30)
@@ -1,27 +1,60 @@
 """Tests for the EMT Madrid integration."""
 
-from unittest.mock import AsyncMock, Mock, patch
+import asyncio
+from datetime import timedelta
+import math
+import time
+from unittest.mock import Mock, patch
 
+import aiohttp
 import pytest
 
-from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import CONF_EMAIL, CONF_PASSWORD
+from homeassistant import config_entries
+from homeassistant.const import (
+    ATTR_ATTRIBUTION,
+    CONF_EMAIL,
+    CONF_PASSWORD,
+    EntityCategory,
+)
 from homeassistant.core import HomeAssistant
 from homeassistant.data_entry_flow import FlowResultType
-
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.util import dt as dt_util
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+from pytest_homeassistant_custom_component.test_util.aiohttp import AiohttpClientMocker
+
+from custom_components.emt_madrid import async_get_token_manager
+from custom_components.emt_madrid.bicimad import BicimadEMT
+from custom_components.emt_madrid.breaker import (
+    FAILURE_THRESHOLD,
+    MAX_BACKOFF,
+    CircuitBreaker,
+)
+from custom_components.emt_madrid.buses import BusesEMT
 from custom_components.emt_madrid.const import (
+    ATTR_ARRIVAL_SECONDS,
     ATTR_BIKES,
+    ATTR_BYTES_RECEIVED,
+    ATTR_DATA_AGE,
     ATTR_DESTINATION,
     ATTR_DISTANCE,
     ATTR_END_TIME,
     ATTR_FREE_BASES,
+    ATTR_HAS_ESTIMATE,
     ATTR_LATITUDE,
     ATTR_LINE,
     ATTR_LONGITUDE,
     ATTR_MAX_FREQ,
     ATTR_MIN_FREQ,
+    ATTR_NEARBY_STATIONS,
     ATTR_NEXT_BUS,
+    ATTR_NEXT_BUS_SECONDS,
     ATTR_ORIGIN,
+    ATTR_PARSE_TIME,
+    ATTR_REQUESTS,
+    ATTR_RESPONSE_CODES,
+    ATTR_STALE,
     ATTR_START_TIME,
     ATTR_STATION_ADDRESS,
     ATTR_STATION_ID,
@@ -32,13 +65,22 @@ from custom_components.emt_madrid.const import (
     ATTR_STOP_NAME,
     ATTRIBUTION,
     CONF_LINES,
+    CONF_MIN_AVAILABLE,
+    CONF_NEARBY_COUNT,
     CONF_SENSOR_TYPE,
+    CONF_STALE_AFTER,
     CONF_STATION_ID,
     CONF_STOP_ID,
     DOMAIN,
     SENSOR_TYPE_BICIMAD,
     SENSOR_TYPE_BUS,
+    SERVICE_CLOSEST_STOPS,
+    SERVICE_NEAREST_STATIONS,
 )
+from custom_components.emt_madrid.coordinator import EMTBicimadCoordinator
+from custom_components.emt_madrid.emt_madrid import APIEMT, TokenManager
+from custom_components.emt_madrid.services import async_setup_services
+from custom_components.emt_madrid.spatial import NEIGHBOUR_COUNT
 
 # ---------------------------------------------------------------------------
 # Mock API responses
@@ -222,6 +264,32 @@ VALID_BICIMAD_STATIONS_LIST = {
     ],
 }
 
+VALID_STOPS_LIST = {
+    "code": "00",
+    "description": "Data recovered OK",
+    "datetime": "2024-01-01T12:00:00.000000",
+    "data": [
+        {
+            "node": "72",
+            "name": "Cibeles-Casa de America",
+            "geometry": {"type": "Point", "coordinates": [-3.692100, 40.419300]},
+            "lines": ["5/1", "14/1", "27/1"],
+        },
+        {
+            "node": "3600",
+            "name": "Sol-Sevilla",
+            "geometry": {"type": "Point", "coordinates": [-3.701500, 40.417200]},
+            "lines": ["3/1", "51/1"],
+        },
+        {
+            "node": "5000",
+            "name": "Plaza de Castilla",
+            "geometry": {"type": "Point", "coordinates": [-3.688500, 40.466300]},
+            "lines": ["27/2"],
+        },
+    ],
+}
+
 
 def _make_request_mock(url, headers=None, data=None, method="POST"):
     """Mock the EMT API requests (v3 endpoints)."""
@@ -234,6 +302,9 @@ def _make_request_mock(url, headers=None, data=None, method="POST"):
             return INVALID_PASSWORD_LOGIN
         return VALID_LOGIN
 
+    if url == f"{base}v3/transport/busemtmad/stops/list/":
+        return VALID_STOPS_LIST
+
     if "/v3/transport/busemtmad/stops/" in url and "/arrives/" in url:
         stop_id = int(url.split("/stops/")[1].split("/arrives")[0])
         if stop_id == 123456:
@@ -255,6 +326,13 @@ def _make_request_mock(url, headers=None, data=None, method="POST"):
     raise ValueError(f"Unexpected URL: {url}")
 
 
+@pytest.fixture(autouse=True)
+def no_result_cache():
+    """Send every request, so tests can count them, unless a test enables reuse."""
+    with patch("custom_components.emt_madrid.coalesce.RESULT_CACHE_TTL", 0):
+        yield
+
+
 # ---------------------------------------------------------------------------
 # Config flow tests
 # ---------------------------------------------------------------------------
@@ -265,6 +343,7 @@ def _make_request_mock(url, headers=None, data=None, method="POST"):
     side_effect=_make_request_mock,
 )
 async def test_config_flow_valid_auth(
+    mock_request: Mock,
     hass: HomeAssistant,
 ) -> None:
     """Test config flow with valid credentials."""
@@ -287,6 +366,7 @@ async def test_config_flow_valid_auth(
     side_effect=_make_request_mock,
 )
 async def test_config_flow_invalid_auth(
+    mock_request: Mock,
     hass: HomeAssistant,
 ) -> None:
     """Test config flow with invalid credentials."""
@@ -302,14 +382,39 @@ async def test_config_flow_invalid_auth(
     assert result["errors"] == {"base": "invalid_auth"}
 
 
+@patch(
+    "custom_components.emt_madrid.emt_madrid.APIEMT._make_request",
+    side_effect=_make_request_mock,
+)
+async def test_config_flow_wrong_password_keeps_token_manager(
+    mock_request: Mock,
+    hass: HomeAssistant,
+) -> None:
+    """Test a failed login in the config flow leaves the shared token manager alone."""
+    manager = async_get_token_manager(hass, "test@mail.com", "password123")
+
+    result = await hass.config_entries.flow.async_init(
+        DOMAIN, context={"source": "user"}
+    )
+    result = await hass.config_entries.flow.async_configure(
+        result["flow_id"],
+        {CONF_EMAIL: "test@mail.com", CONF_PASSWORD: "invalid_password"},
+    )
+
+    assert result["errors"] == {"base": "invalid_auth"}
+    assert async_get_token_manager(hass, "test@mail.com", "password123") is manager
+
+
 @patch(
     "custom_components.emt_madrid.emt_madrid.APIEMT._make_request",
     side_effect=_make_request_mock,
 )
 async def test_config_flow_bus_sensor(
+    mock_request: Mock,
     hass: HomeAssistant,
 ) -> None:
     """Test full config flow for a bus sensor."""
+    hass.config.latitude, hass.config.longitude = 40.416775, -3.703790
     result = await hass.config_entries.flow.async_init(
         DOMAIN, context={"source": "user"}
     )
@@ -324,6 +429,10 @@ async def test_config_flow_bus_sensor(
         {CONF_SENSOR_TYPE: SENSOR_TYPE_BUS},
     )
     assert result["step_id"] == "bus"
+    assert result["description_placeholders"]["nearby_stops"] == (
+        "3600 - Sol-Sevilla (200 m), 72 - Cibeles-Casa de America (1029 m), "
+        "5000 - Plaza de Castilla (5657 m)"
+    )
 
     result = await hass.config_entries.flow.async_configure(
         result["flow_id"],
@@ -340,6 +449,7 @@ async def test_config_flow_bus_sensor(
     side_effect=_make_request_mock,
 )
 async def test_config_flow_bus_no_lines(
+    mock_request: Mock,
     hass: HomeAssistant,
 ) -> None:
     """Test config flow for a bus sensor without specifying lines."""
@@ -367,6 +477,7 @@ async def test_config_flow_bus_no_lines(
     side_effect=_make_request_mock,
 )
 async def test_config_flow_bicimad_sensor(
+    mock_request: Mock,
     hass: HomeAssistant,
 ) -> None:
     """Test full config flow for a BiciMad sensor."""
@@ -392,11 +503,47 @@ async def test_config_flow_bicimad_sensor(
     assert result["data"][CONF_SENSOR_TYPE] == SENSOR_TYPE_BICIMAD
 
 
+@patch(
+    "custom_components.emt_madrid.emt_madrid.APIEMT._make_request",
+    side_effect=_make_request_mock,
+)
+async def test_config_flow_bicimad_station_catalog(
+    mock_request: Mock,
+    hass: HomeAssistant,
+) -> None:
+    """Test adding several stations fetches the station list only once."""
+    for _ in range(2):
+        result = await hass.config_entries.flow.async_init(
+            DOMAIN, context={"source": "user"}
+        )
+        if result["step_id"] == "user":
+            result = await hass.config_entries.flow.async_configure(
+                result["flow_id"],
+                {CONF_EMAIL: "test@mail.com", CONF_PASSWORD: "password123"},
+            )
+        result = await hass.config_entries.flow.async_configure(
+            result["flow_id"],
+            {CONF_SENSOR_TYPE: SENSOR_TYPE_BICIMAD},
+        )
+        assert result["step_id"] == "bicimad"
+        options = result["data_schema"].schema[CONF_STATION_ID].container
+        assert options == {1001: "1001 - Sol", 2139: "2139 - Gran Via"}
+        hass.config_entries.flow.async_abort(result["flow_id"])
+
+    station_requests = [
+        call
+        for call in mock_request.call_args_list
+        if call.args[0].endswith("/bicimad/stations/")
+    ]
+    assert len(station_requests) == 1
+
+
 @patch(
     "custom_components.emt_madrid.emt_madrid.APIEMT._make_request",
     side_effect=_make_request_mock,
 )
 async def test_config_flow_credential_reuse(
+    mock_request: Mock,
     hass: HomeAssistant,
 ) -> None:
     """Test that credentials are reused on subsequent config flows."""
@@ -434,10 +581,12 @@ async def test_config_flow_credential_reuse(
     side_effect=_make_request_mock,
 )
 async def test_bus_sensor_attributes(
+    mock_request: Mock,
     hass: HomeAssistant,
 ) -> None:
     """Test bus sensor attributes including latitude/longitude."""
     entry = Mock()
+    entry.options = {}
     entry.entry_id = "test_bus_entry"
     entry.data = {
         CONF_EMAIL: "test@mail.com",
@@ -455,7 +604,7 @@ async def test_bus_sensor_attributes(
     await async_setup_entry(hass, entry, add_entities)
     await hass.async_block_till_done()
 
-    assert len(entities) == 1
+    assert len(entities) == 2
     sensor = entities[0]
 
     assert sensor.name == "Bus 27 - Cibeles-Casa de America"
@@ -464,6 +613,8 @@ async def test_bus_sensor_attributes(
 
     attrs = sensor.extra_state_attributes
     assert attrs[ATTR_NEXT_BUS] == 25
+    assert attrs[ATTR_ARRIVAL_SECONDS] == 233
+    assert attrs[ATTR_NEXT_BUS_SECONDS] == 1556
     assert attrs[ATTR_STOP_ID] == 72
     assert attrs[ATTR_LINE] == "27"
     assert attrs[ATTR_DISTANCE] == 674
@@ -477,7 +628,7 @@ async def test_bus_sensor_attributes(
     assert attrs[ATTR_STOP_ADDRESS] == "Paseo de Recoletos 2"
     assert attrs[ATTR_LATITUDE] == 40.420361
     assert attrs[ATTR_LONGITUDE] == -3.692144
-    assert attrs[ATTRIBUTION] == ATTRIBUTION
+    assert attrs[ATTR_ATTRIBUTION] == ATTRIBUTION
 
 
 @patch(
@@ -485,10 +636,12 @@ async def test_bus_sensor_attributes(
     side_effect=_make_request_mock,
 )
 async def test_bus_sensor_all_lines(
+    mock_request: Mock,
     hass: HomeAssistant,
 ) -> None:
     """Test bus sensor creates entities for all lines when none specified."""
     entry = Mock()
+    entry.options = {}
     entry.entry_id = "test_bus_all"
     entry.data = {
         CONF_EMAIL: "test@mail.com",
@@ -506,7 +659,7 @@ async def test_bus_sensor_all_lines(
     await async_setup_entry(hass, entry, add_entities)
     await hass.async_block_till_done()
 
-    assert len(entities) == 2
+    assert len(entities) == 3
     line_labels = {e.name for e in entities}
     assert "Bus 27 - Cibeles-Casa de America" in line_labels
     assert "Bus 5 - Cibeles-Casa de America" in line_labels
@@ -517,10 +670,12 @@ async def test_bus_sensor_all_lines(
     side_effect=_make_request_mock,
 )
 async def test_bicimad_sensor_attributes(
+    mock_request: Mock,
     hass: HomeAssistant,
 ) -> None:
     """Test BiciMad sensor attributes including latitude/longitude."""
     entry = Mock()
+    entry.options = {}
     entry.entry_id = "test_bici_entry"
     entry.data = {
         CONF_EMAIL: "test@mail.com",
@@ -537,7 +692,7 @@ async def test_bicimad_sensor_attributes(
     await async_setup_entry(hass, entry, add_entities)
     await hass.async_block_till_done()
 
-    assert len(entities) == 1
+    assert len(entities) == 3
     sensor = entities[0]
 
     assert sensor.name == "Bicimad Gran Via"
@@ -553,4 +708,1049 @@ async def test_bicimad_sensor_attributes(
     assert attrs[ATTR_BIKES] == 5
     assert attrs[ATTR_LATITUDE] == 40.420000
     assert attrs[ATTR_LONGITUDE] == -3.707500
-    assert attrs[ATTRIBUTION] == ATTRIBUTION
+    assert attrs[ATTR_ATTRIBUTION] == ATTRIBUTION
+
+
+@patch(
+    "custom_components.emt_madrid.emt_madrid.APIEMT._make_request",
+    side_effect=_make_request_mock,
+)
+async def test_bicimad_nearest_available_stations(
+    mock_request: Mock,
+    hass: HomeAssistant,
+) -> None:
+    """Test the closest stations with enough bikes or free bases are found locally."""
+    entry = Mock()
+    entry.options = {CONF_MIN_AVAILABLE: 6, CONF_NEARBY_COUNT: 2}
+    entry.entry_id = "test_bici_nearby"
+    entry.data = {
+        CONF_EMAIL: "test@mail.com",
+        CONF_PASSWORD: "password123",
+        CONF_SENSOR_TYPE: SENSOR_TYPE_BICIMAD,
+        CONF_STATION_ID: 2139,
+    }
+
+    entities = []
+    from custom_components.emt_madrid.sensor import async_setup_entry
+
+    await async_setup_entry(hass, entry, Mock(side_effect=entities.extend))
+    await hass.async_block_till_done()
+    bikes, free_bases = entities[1:]
+
+    assert bikes.name == "Bicimad Gran Via nearest bikes"
+    assert not bikes.entity_registry_enabled_default
+    assert bikes.native_value == 477
+    assert bikes.extra_state_attributes[ATTR_NEARBY_STATIONS] == [
+        {
+            "station_id": 1001,
+            "station_number": "1001",
+            "station_name": "Sol",
+            "distance": 477,
+            "bikes": 12,
+            "free_bases": 3,
+        }
+    ]
+    assert free_bases.name == "Bicimad Gran Via nearest free bases"
+    assert free_bases.native_value == 0
+    assert [
+        station["station_id"]
+        for station in free_bases.extra_state_attributes[ATTR_NEARBY_STATIONS]
+    ] == [2139]
+
+    async_setup_services(hass)
+    response = await hass.services.async_call(
+        DOMAIN,
+        SERVICE_NEAREST_STATIONS,
+        {ATTR_STATION_ID: 1001, "limit": 5, "min_bikes": 1},
+        blocking=True,
+        return_response=True,
+    )
+    assert [station["station_id"] for station in response["stations"]] == [1001, 2139]
+
+    # Every answer came from the one network snapshot.
+    assert [
+        call.args[0]
+        for call in mock_request.call_args_list
+        if "/bicimad/" in call.args[0]
+    ] == ["https://openapi.emtmadrid.es/v3/transport/bicimad/stations/"]
+
+
+async def test_bicimad_nearest_available_looks_past_neighbour_table(
+    hass: HomeAssistant,
+) -> None:
+    """Test stations beyond the precomputed neighbours are found when needed."""
+    # A row of stations 50 m apart where only the farthest ones have bikes.
+    network = {
+        "code": "00",
+        "data": [
+            {
+                "id": str(station_id),
+                "name": f"Station {station_id}",
+                "geometry": {
+                    "coordinates": [-3.7, 40.4 + station_id * 0.00045],
+                },
+                "dock_bikes": 5 if station_id > NEIGHBOUR_COUNT + 5 else 0,
+                "free_bases": 10,
+            }
+            for station_id in range(1, NEIGHBOUR_COUNT + 11)
+        ],
+    }
+    coordinator = EMTBicimadCoordinator(
+        hass,
+        BicimadEMT(async_get_clientsession(hass), "test@mail.com", "password123"),
+    )
+    with patch(
+        "custom_components.emt_madrid.emt_madrid.APIEMT._make_request",
+        side_effect=lambda url, **kwargs: (
+            network if url.endswith("/bicimad/stations/") else VALID_LOGIN
+        ),
+    ):
+        await coordinator.bicimad_emt.authenticate()
+        await coordinator.async_refresh()
+
+    nearby = coordinator.nearest_available(1, 3, min_bikes=1)
+
+    assert [station.station_id for _, station in nearby] == [
+        NEIGHBOUR_COUNT + 6,
+        NEIGHBOUR_COUNT + 7,
+        NEIGHBOUR_COUNT + 8,
+    ]
+    assert coordinator.nearest_available(1, 10, min_bikes=6) == []
+
+
+@patch(
+    "custom_components.emt_madrid.emt_madrid.APIEMT._make_request",
+    side_effect=_make_request_mock,
+)
+async def test_bus_sensors_share_arrivals_request(
+    mock_request: Mock,
+    hass: HomeAssistant,
+) -> None:
+    """Test a refresh fetches the arrivals once for every line sensor of the stop."""
+    entry = Mock()
+    entry.options = {}
+    entry.entry_id = "test_bus_shared"
+    entry.data = {
+        CONF_EMAIL: "test@mail.com",
+        CONF_PASSWORD: "password123",
+        CONF_SENSOR_TYPE: SENSOR_TYPE_BUS,
+        CONF_STOP_ID: 72,
+        CONF_LINES: [],
+    }
+
+    entities = []
+    add_entities = Mock(side_effect=entities.extend)
+
+    from custom_components.emt_madrid.sensor import async_setup_entry
+
+    await async_setup_entry(hass, entry, add_entities)
+    await hass.async_block_till_done()
+    assert len(entities) == 3
+
+    mock_request.reset_mock()
+    await entities[0].coordinator.async_refresh()
+
+    arrivals_calls = [
+        call for call in mock_request.call_args_list if "/arrives/" in call.args[0]
+    ]
+    assert len(arrivals_calls) == 1
+    assert entities[0].coordinator is entities[1].coordinator
+    assert {e.native_value for e in entities[:2]} == {3, 5}
+
+
+@patch(
+    "custom_components.emt_madrid.emt_madrid.APIEMT._make_request",
+    side_effect=_make_request_mock,
+)
+async def test_bus_sensor_attributes_built_once_per_update(
+    mock_request: Mock,
+    hass: HomeAssistant,
+) -> None:
+    """Test attributes are reused between reads and only rebuilt on updates."""
+    entry = Mock()
+    entry.options = {}
+    entry.entry_id = "test_bus_attributes_cached"
+    entry.data = {
+        CONF_EMAIL: "test@mail.com",
+        CONF_PASSWORD: "password123",
+        CONF_SENSOR_TYPE: SENSOR_TYPE_BUS,
+        CONF_STOP_ID: 72,
+        CONF_LINES: ["27"],
+    }
+    entities = []
+
+    from custom_components.emt_madrid.sensor import async_setup_entry
+
+    await async_setup_entry(hass, entry, Mock(side_effect=entities.extend))
+    await hass.async_block_till_done()
+
+    sensor = entities[0]
+    attrs = sensor.extra_state_attributes
+    assert sensor.extra_state_attributes is attrs
+    static_attributes = sensor._static_attributes
+
+    await sensor.coordinator.async_refresh()
+    sensor._update_attributes()
+
+    assert sensor.extra_state_attributes == attrs
+    assert sensor._static_attributes is static_attributes
+
+
+@patch(
+    "custom_components.emt_madrid.emt_madrid.APIEMT._make_request",
+    side_effect=_make_request_mock,
+)
+async def test_unchanged_data_skips_state_write(
+    mock_request: Mock,
+    hass: HomeAssistant,
+) -> None:
+    """Test sensors only write their state when a refresh changes it."""
+    entry = Mock()
+    entry.options = {}
+    entry.entry_id = "test_bicimad_unchanged"
+    entry.data = {
+        CONF_EMAIL: "test@mail.com",
+        CONF_PASSWORD: "password123",
+        CONF_SENSOR_TYPE: SENSOR_TYPE_BICIMAD,
+        CONF_STATION_ID: 2139,
+    }
+    entities = []
+
+    from custom_components.emt_madrid.sensor import async_setup_entry
+
+    await async_setup_entry(hass, entry, Mock(side_effect=entities.extend))
+    await hass.async_block_till_done()
+
+    sensor = entities[0]
+    with patch.object(sensor, "async_write_ha_state") as write_state:
+        sensor._written_available = True
+        await sensor.coordinator.async_refresh()
+        sensor._handle_coordinator_update()
+        write_state.assert_not_called()
+
+        stations = {
+            **VALID_BICIMAD_STATIONS_LIST,
+            "data": [
+                {**VALID_BICIMAD_STATIONS_LIST["data"][0], "dock_bikes": 4},
+                VALID_BICIMAD_STATIONS_LIST["data"][1],
+            ],
+        }
+        mock_request.side_effect = lambda url, **kwargs: (
+            stations if url.endswith("/stations/") else _make_request_mock(url, **kwargs)
+        )
+        await sensor.coordinator.async_refresh()
+        sensor._handle_coordinator_update()
+        write_state.assert_called_once()
+    assert sensor.native_value == 4
+
+
+@patch(
+    "custom_components.emt_madrid.emt_madrid.APIEMT._make_request",
+    side_effect=_make_request_mock,
+)
+async def test_bus_arrival_countdown(
+    mock_request: Mock,
+    hass: HomeAssistant,
+) -> None:
+    """Test arrival times count down locally between updates."""
+    entry = Mock()
+    entry.options = {}
+    entry.entry_id = "test_bus_countdown"
+    entry.data = {
+        CONF_EMAIL: "test@mail.com",
+        CONF_PASSWORD: "password123",
+        CONF_SENSOR_TYPE: SENSOR_TYPE_BUS,
+        CONF_STOP_ID: 72,
+        CONF_LINES: ["27"],
+    }
+    entities = []
+
+    from custom_components.emt_madrid.sensor import async_setup_entry
+
+    with patch(
+        "custom_components.emt_madrid.buses.time.monotonic", return_value=1000.0
+    ):
+        await async_setup_entry(hass, entry, Mock(side_effect=entities.extend))
+        await hass.async_block_till_done()
+
+    buses_emt = entities[0].coordinator.buses_emt
+    mock_request.reset_mock()
+    with patch(
+        "custom_components.emt_madrid.buses.time.monotonic", return_value=1120.0
+    ):
+        assert buses_emt.get_arrival_countdown("27") == (113, 1436)
+    with patch(
+        "custom_components.emt_madrid.buses.time.monotonic", return_value=1300.0
+    ):
+        assert buses_emt.get_arrival_countdown("27") == (0, 1256)
+    assert buses_emt.get_arrival_countdown("99") == (None, None)
+    mock_request.assert_not_called()
+
+
+def test_to_minutes_rounding() -> None:
+    """Test arrival times are rounded down unless a sensor chooses otherwise."""
+    from custom_components.emt_madrid.models import to_minutes
+
+    assert to_minutes((113, None)) == (1, None)
+    assert to_minutes((113, 1436), math.ceil) == (2, 24)
+
+
+async def test_bus_arrivals_without_clamp_or_estimate(
+    hass: HomeAssistant,
+) -> None:
+    """Test long waits are kept and the no estimate sentinel is explicit."""
+    arrivals = {
+        **VALID_ARRIVALS,
+        "data": [
+            {
+                "Arrive": [
+                    {"line": "27", "estimateArrive": 3000, "DistanceBus": 9000},
+                    {"line": "5", "estimateArrive": 999999, "DistanceBus": 0},
+                ]
+            }
+        ],
+    }
+
+    def _long_wait_mock(url, headers=None, data=None, method="POST"):
+        if "/arrives/" in url:
+            return arrivals
+        return _make_request_mock(url, headers, data, method)
+
+    entry = Mock()
+    entry.options = {}
+    entry.entry_id = "test_bus_long_wait"
+    entry.data = {
+        CONF_EMAIL: "test@mail.com",
+        CONF_PASSWORD: "password123",
+        CONF_SENSOR_TYPE: SENSOR_TYPE_BUS,
+        CONF_STOP_ID: 72,
+        CONF_LINES: ["27", "5"],
+    }
+    entities = []
+
+    from custom_components.emt_madrid.sensor import async_setup_entry
+
+    with patch(
+        "custom_components.emt_madrid.emt_madrid.APIEMT._make_request",
+        side_effect=_long_wait_mock,
+    ):
+        await async_setup_entry(hass, entry, Mock(side_effect=entities.extend))
+        await hass.async_block_till_done()
+
+    line_27, line_5, _ = entities
+    assert line_27.native_value == 50
+    assert line_27.extra_state_attributes[ATTR_ARRIVAL_SECONDS] == 3000
+    assert line_27.extra_state_attributes[ATTR_HAS_ESTIMATE] is True
+    assert line_5.native_value is None
+    assert line_5.extra_state_attributes[ATTR_ARRIVAL_SECONDS] is None
+    assert line_5.extra_state_attributes[ATTR_HAS_ESTIMATE] is False
+
+    # Reading the state does not pad or otherwise change the shared snapshot.
+    snapshot = line_27.coordinator.data
+    assert line_27.extra_state_attributes[ATTR_NEXT_BUS] is None
+    assert line_27.coordinator.buses_emt.get_arrival_time("27") == (50, None)
+    assert len(snapshot.lines["27"].arrivals) == 1
+    assert snapshot.lines["27"].distance == 9000
+
+
+@patch(
+    "custom_components.emt_madrid.emt_madrid.APIEMT._make_request",
+    side_effect=_make_request_mock,
+)
+async def test_bus_setup_request_count(
+    mock_request: Mock,
+    hass: HomeAssistant,
+) -> None:
+    """Test setting up a stop needs one login, one detail and one arrivals request."""
+    entry = Mock()
+    entry.options = {}
+    entry.entry_id = "test_bus_setup"
+    entry.data = {
+        CONF_EMAIL: "test@mail.com",
+        CONF_PASSWORD: "password123",
+        CONF_SENSOR_TYPE: SENSOR_TYPE_BUS,
+        CONF_STOP_ID: 72,
+        CONF_LINES: ["27", "5"],
+    }
+
+    entities = []
+    add_entities = Mock(side_effect=entities.extend)
+
+    from custom_components.emt_madrid.sensor import async_setup_entry
+
+    await async_setup_entry(hass, entry, add_entities)
+    await hass.async_block_till_done()
+
+    assert len(entities) == 3
+    urls = [call.args[0] for call in mock_request.call_args_list]
+    assert len(urls) == 3
+    assert sum("/detail/" in url for url in urls) == 1
+    assert sum("/arrives/" in url for url in urls) == 1
+
+
+@patch(
+    "custom_components.emt_madrid.emt_madrid.APIEMT._make_request",
+    side_effect=_make_request_mock,
+)
+async def test_entries_share_account_login(
+    mock_request: Mock,
+    hass: HomeAssistant,
+) -> None:
+    """Test entries of the same account reuse a single login."""
+    from custom_components.emt_madrid.sensor import async_setup_entry
+
+    for entry_id, data in (
+        ("test_shared_bus", {CONF_SENSOR_TYPE: SENSOR_TYPE_BUS, CONF_STOP_ID: 72}),
+        (
+            "test_shared_bici",
+            {CONF_SENSOR_TYPE: SENSOR_TYPE_BICIMAD, CONF_STATION_ID: 2139},
+        ),
+    ):
+        entry = Mock()
+        entry.options = {}
+        entry.entry_id = entry_id
+        entry.data = {CONF_EMAIL: "test@mail.com", CONF_PASSWORD: "password123", **data}
+        await async_setup_entry(hass, entry, Mock())
+    await hass.async_block_till_done()
+
+    logins = [
+        call for call in mock_request.call_args_list if "/user/login/" in call.args[0]
+    ]
+    assert len(logins) == 1
+
+
+@patch(
+    "custom_components.emt_madrid.emt_madrid.APIEMT._make_request",
+    side_effect=_make_request_mock,
+)
+async def test_bicimad_sensors_share_network_request(
+    mock_request: Mock,
+    hass: HomeAssistant,
+) -> None:
+    """Test all BiciMad station sensors are fed by one all-stations request."""
+    from custom_components.emt_madrid.sensor import async_setup_entry
+
+    entities = []
+    entries = []
+    for station_id in (2139, 1001):
+        entry = Mock()
+        entries.append(entry)
+        entry.options = {}
+        entry.entry_id = f"test_bici_{station_id}"
+        entry.data = {
+            CONF_EMAIL: "test@mail.com",
+            CONF_PASSWORD: "password123",
+            CONF_SENSOR_TYPE: SENSOR_TYPE_BICIMAD,
+            CONF_STATION_ID: station_id,
+        }
+        await async_setup_entry(hass, entry, Mock(side_effect=entities.extend))
+    await hass.async_block_till_done()
+
+    assert entities[0].coordinator is entities[3].coordinator
+    for entry in entries:
+        entry.async_on_unload.assert_any_call(entities[0].coordinator.async_shutdown)
+    assert [e.name for e in entities[::3]] == ["Bicimad Gran Via", "Bicimad Sol"]
+    assert [e.native_value for e in entities[::3]] == [5, 12]
+
+    mock_request.reset_mock()
+    await entities[0].coordinator.async_refresh()
+
+    assert [call.args[0] for call in mock_request.call_args_list] == [
+        "https://openapi.emtmadrid.es/v3/transport/bicimad/stations/"
+    ]
+
+
+async def test_bicimad_coordinator_shut_down_by_last_entry(
+    hass: HomeAssistant,
+) -> None:
+    """Test the shared BiciMad coordinator outlives every entry but the last one."""
+    from custom_components.emt_madrid import async_get_bicimad_coordinator
+    from custom_components.emt_madrid.const import DATA_BICIMAD_COORDINATORS
+
+    token = config_entries.current_entry.set(MockConfigEntry(domain=DOMAIN))
+    try:
+        coordinator = async_get_bicimad_coordinator(
+            hass, "test@mail.com", "password123"
+        )
+    finally:
+        config_entries.current_entry.reset(token)
+
+    assert coordinator.config_entry is None
+
+    remove_listeners = [coordinator.async_add_listener(Mock()) for _ in range(2)]
+    remove_listeners[0]()
+    await coordinator.async_shutdown()
+
+    coordinators = hass.data[DOMAIN][DATA_BICIMAD_COORDINATORS]
+    assert coordinators["test@mail.com"] is coordinator
+
+    remove_listeners[1]()
+    await coordinator.async_shutdown()
+
+    assert "test@mail.com" not in coordinators
+
+
+CACHED_STOP_INFO = {
+    "bus_stop_id": 72,
+    "bus_stop_name": "Cibeles-Casa de America",
+    "bus_stop_coordinates": [-3.692144, 40.420361],
+    "bus_stop_address": "Paseo de Recoletos 2",
+    "lines": {
+        "27": {
+            "destination": "PLAZA CASTILLA",
+            "origin": "EMBAJADORES",
+            "max_freq": 25,
+            "min_freq": 11,
+            "start_time": "07:00",
+            "end_time": "00:01",
+            "day_type": "FE",
+        },
+    },
+}
+
+
+@pytest.mark.parametrize(
+    ("age_days", "detail_requests"),
+    [(1, 0), (30, 1)],
+)
+@patch(
+    "custom_components.emt_madrid.emt_madrid.APIEMT._make_request",
+    side_effect=_make_request_mock,
+)
+async def test_bus_setup_uses_stored_stop_info(
+    mock_request: Mock,
+    hass: HomeAssistant,
+    hass_storage: dict,
+    age_days: int,
+    detail_requests: int,
+) -> None:
+    """Test stop details are served from disk and refreshed in the background once expired."""
+    hass_storage["emt_madrid.stops"] = {
+        "version": 1,
+        "minor_version": 1,
+        "key": "emt_madrid.stops",
+        "data": {
+            "72": {
+                "fetched_at": dt_util.utcnow().timestamp() - age_days * 86400,
+                "stop_info": CACHED_STOP_INFO,
+            }
+        },
+    }
+    entry = Mock()
+    entry.options = {}
+    entry.entry_id = "test_bus_cached"
+    entry.data = {
+        CONF_EMAIL: "test@mail.com",
+        CONF_PASSWORD: "password123",
+        CONF_SENSOR_TYPE: SENSOR_TYPE_BUS,
+        CONF_STOP_ID: 72,
+        CONF_LINES: [],
+    }
+    entities = []
+
+    from custom_components.emt_madrid.sensor import async_setup_entry
+
+    await async_setup_entry(hass, entry, Mock(side_effect=entities.extend))
+
+    assert [e.name for e in entities[:-1]] == ["Bus 27 - Cibeles-Casa de America"]
+    assert entities[0].native_value == 3
+
+    await hass.async_block_till_done()
+    await asyncio.gather(*hass._background_tasks)
+    urls = [call.args[0] for call in mock_request.call_args_list]
+    assert sum("/detail/" in url for url in urls) == detail_requests
+    assert sum("/arrives/" in url for url in urls) == 1
+
+
+async def test_expired_token_is_refreshed_transparently(
+    hass: HomeAssistant,
+) -> None:
+    """Test an arrivals request rejected with code 80 logs in again and retries."""
+    expired = {"test-token-abc123"}
+
+    def _expiring_token_mock(url, headers=None, data=None, method="POST"):
+        if "/user/login/" in url:
+            response = dict(VALID_LOGIN)
+            response["data"] = [{"accessToken": "fresh-token"}]
+            return response
+        if headers.get("accessToken") in expired:
+            return {"code": "80", "description": "Invalid token", "data": []}
+        return _make_request_mock(url, headers, data, method)
+
+    entry = Mock()
+    entry.options = {}
+    entry.entry_id = "test_bus_expired"
+    entry.data = {
+        CONF_EMAIL: "test@mail.com",
+        CONF_PASSWORD: "password123",
+        CONF_SENSOR_TYPE: SENSOR_TYPE_BUS,
+        CONF_STOP_ID: 72,
+        CONF_LINES: ["27"],
+    }
+    entities = []
+
+    from custom_components.emt_madrid.sensor import async_setup_entry
+
+    with patch(
+        "custom_components.emt_madrid.emt_madrid.APIEMT._make_request",
+        side_effect=_make_request_mock,
+    ):
+        await async_setup_entry(hass, entry, Mock(side_effect=entities.extend))
+        await hass.async_block_till_done()
+
+    with patch(
+        "custom_components.emt_madrid.emt_madrid.APIEMT._make_request",
+        side_effect=_expiring_token_mock,
+    ) as mock_request:
+        await entities[0].coordinator.async_refresh()
+
+    urls = [call.args[0] for call in mock_request.call_args_list]
+    assert sum("/user/login/" in url for url in urls) == 1
+    assert sum("/arrives/" in url for url in urls) == 2
+    assert mock_request.call_args_list[-1].kwargs["headers"] == {
+        "accessToken": "fresh-token"
+    }
+    assert entities[0].coordinator.last_update_success
+    assert entities[0].native_value == 3
+
+
+# ---------------------------------------------------------------------------
+# API client tests
+# ---------------------------------------------------------------------------
+
+
+async def test_api_authenticate_with_shared_session(
+    hass: HomeAssistant,
+    aioclient_mock: AiohttpClientMocker,
+) -> None:
+    """Test the client logs in through Home Assistant's aiohttp session."""
+    aioclient_mock.get(
+        "https://openapi.emtmadrid.es/v3/mobilitylabs/user/login/",
+        json=VALID_LOGIN,
+    )
+
+    api = APIEMT(async_get_clientsession(hass), "test@mail.com", "password123")
+    token = await api.authenticate()
+
+    assert token == "test-token-abc123"
+    assert api.get_token() == "test-token-abc123"
+    assert aioclient_mock.call_count == 1
+    assert aioclient_mock.mock_calls[0][3]["email"] == "test@mail.com"
+
+
+async def test_clients_use_base_url_of_token_manager(
+    hass: HomeAssistant,
+    aioclient_mock: AiohttpClientMocker,
+) -> None:
+    """Test every client of an account talks to the server its manager logs in to."""
+    base_url = "http://127.0.0.1:8080/"
+    aioclient_mock.get(f"{base_url}v3/mobilitylabs/user/login/", json=VALID_LOGIN)
+    aioclient_mock.post(
+        f"{base_url}v3/transport/busemtmad/stops/72/arrives/", json=VALID_ARRIVALS
+    )
+
+    session = async_get_clientsession(hass)
+    manager = TokenManager(
+        APIEMT(session, "test@mail.com", "password123", base_url=base_url)
+    )
+    buses = BusesEMT(session, "test@mail.com", "password123", 72, manager)
+    await buses.update_arrival_times(72)
+
+    assert buses.base_url == base_url
+    assert aioclient_mock.call_count == 2
+
+
+async def test_token_manager_deduplicates_logins(
+    hass: HomeAssistant,
+) -> None:
+    """Test concurrent callers and stale refreshes share a single login."""
+    logins = 0
+
+    async def _login_mock(url, headers=None, data=None, method="POST"):
+        nonlocal logins
+        logins += 1
+        await asyncio.sleep(0)
+        response = dict(VALID_LOGIN)
+        response["data"] = [{"accessToken": f"token-{logins}"}]
+        return response
+
+    with patch(
+        "custom_components.emt_madrid.emt_madrid.APIEMT._make_request",
+        side_effect=_login_mock,
+    ):
+        manager = TokenManager(APIEMT(Mock(), "test@mail.com", "password123"))
+
+        tokens = await asyncio.gather(*(manager.async_get_token() for _ in range(5)))
+        assert tokens == ["token-1"] * 5
+        assert logins == 1
+
+        tokens = await asyncio.gather(
+            *(manager.async_refresh_token("token-1") for _ in range(5))
+        )
+        assert tokens == ["token-2"] * 5
+        assert logins == 2
+
+
+async def test_last_arrivals_kept_while_api_is_failing(
+    hass: HomeAssistant,
+) -> None:
+    """Test an open circuit keeps the last arrivals, marked stale, without requests."""
+    entry = Mock()
+    entry.options = {}
+    entry.entry_id = "test_bus_outage"
+    entry.data = {
+        CONF_EMAIL: "test@mail.com",
+        CONF_PASSWORD: "password123",
+        CONF_SENSOR_TYPE: SENSOR_TYPE_BUS,
+        CONF_STOP_ID: 72,
+        CONF_LINES: ["27"],
+    }
+    entities = []
+
+    from custom_components.emt_madrid.sensor import async_setup_entry
+
+    with patch(
+        "custom_components.emt_madrid.emt_madrid.APIEMT._make_request",
+        side_effect=_make_request_mock,
+    ):
+        await async_setup_entry(hass, entry, Mock(side_effect=entities.extend))
+        await hass.async_block_till_done()
+
+    sensor = entities[0]
+    coordinator = sensor.coordinator
+    with patch(
+        "custom_components.emt_madrid.emt_madrid.APIEMT._make_request",
+        side_effect=aiohttp.ClientError("Service unavailable"),
+    ) as mock_request:
+        for _ in range(3):
+            await coordinator.async_refresh()
+        assert mock_request.call_count == 3
+
+        sensor._update_attributes()
+        assert sensor.available
+        assert sensor.native_value == 3
+        assert sensor.extra_state_attributes[ATTR_STALE] is True
+        assert coordinator.update_interval >= timedelta(seconds=15)
+
+        await coordinator.async_refresh()
+        assert mock_request.call_count == 3
+
+
+async def test_stale_data_served_until_limit(
+    hass: HomeAssistant,
+) -> None:
+    """Test the last station data is served with its age until it gets too old."""
+    entry = Mock()
+    entry.options = {CONF_STALE_AFTER: 5}
+    entry.entry_id = "test_bicimad_stale"
+    entry.data = {
+        CONF_EMAIL: "test@mail.com",
+        CONF_PASSWORD: "password123",
+        CONF_SENSOR_TYPE: SENSOR_TYPE_BICIMAD,
+        CONF_STATION_ID: 2139,
+    }
+    entities = []
+
+    from custom_components.emt_madrid.sensor import async_setup_entry
+
+    with patch(
+        "custom_components.emt_madrid.emt_madrid.APIEMT._make_request",
+        side_effect=_make_request_mock,
+    ):
+        await async_setup_entry(hass, entry, Mock(side_effect=entities.extend))
+        await hass.async_block_till_done()
+
+    sensor = entities[0]
+    coordinator = sensor.coordinator
+    assert sensor.extra_state_attributes[ATTR_DATA_AGE] == 0
+
+    with patch(
+        "custom_components.emt_madrid.emt_madrid.APIEMT._make_request",
+        side_effect=aiohttp.ClientError("Service unavailable"),
+    ):
+        await coordinator.async_refresh()
+
+    coordinator.data_updated_at -= 4 * 60
+    sensor._update_attributes()
+    assert sensor.available
+    assert sensor.extra_state_attributes[ATTR_STALE] is True
+    assert sensor.extra_state_attributes[ATTR_DATA_AGE] == 240
+
+    coordinator.data_updated_at -= 2 * 60
+    assert not sensor.available
+
+
+@pytest.mark.parametrize(
+    ("sensor_type", "config", "failure"),
+    [
+        (
+            SENSOR_TYPE_BICIMAD,
+            {CONF_STATION_ID: 2139},
+            patch(
+                "custom_components.emt_madrid.emt_madrid.APIEMT._make_request",
+                return_value={"code": "98", "description": "API limit reached"},
+            ),
+        ),
+        (
+            SENSOR_TYPE_BUS,
+            {CONF_STOP_ID: 72, CONF_LINES: ["27"]},
+            patch.object(TokenManager, "async_get_token", return_value=None),
+        ),
+    ],
+)
+async def test_data_keeps_ageing_without_new_payload(
+    hass: HomeAssistant,
+    sensor_type: str,
+    config: dict,
+    failure,
+) -> None:
+    """Test a poll that brings no new data counts as failed and keeps the data age."""
+    entry = Mock()
+    entry.options = {}
+    entry.entry_id = f"test_{sensor_type}_no_payload"
+    entry.data = {
+        CONF_EMAIL: "test@mail.com",
+        CONF_PASSWORD: "password123",
+        CONF_SENSOR_TYPE: sensor_type,
+        **config,
+    }
+    entities = []
+
+    from custom_components.emt_madrid.sensor import async_setup_entry
+
+    with patch(
+        "custom_components.emt_madrid.emt_madrid.APIEMT._make_request",
+        side_effect=_make_request_mock,
+    ):
+        await async_setup_entry(hass, entry, Mock(side_effect=entities.extend))
+        await hass.async_block_till_done()
+
+    sensor = entities[0]
+    coordinator = sensor.coordinator
+    coordinator.data_updated_at -= 60 * 60
+
+    with failure:
+        await coordinator.async_refresh()
+    sensor._update_attributes()
+
+    assert not coordinator.last_update_success
+    assert coordinator.data_age >= 60 * 60
+    assert sensor.extra_state_attributes[ATTR_STALE] is True
+    assert not sensor.available
+
+
+async def test_bus_stop_api_metrics(
+    hass: HomeAssistant,
+    aioclient_mock: AiohttpClientMocker,
+) -> None:
+    """Test the requests of a stop are measured and shown by a diagnostic sensor."""
+    base = "https://openapi.emtmadrid.es/v3/"
+    aioclient_mock.get(f"{base}mobilitylabs/user/login/", json=VALID_LOGIN)
+    aioclient_mock.get(f"{base}transport/busemtmad/stops/72/detail/", json=VALID_STOP_INFO)
+    aioclient_mock.post(
+        f"{base}transport/busemtmad/stops/72/arrives/", json=VALID_ARRIVALS
+    )
+    entry = Mock()
+    entry.options = {}
+    entry.entry_id = "test_bus_metrics"
+    entry.as_dict.return_value = {"data": {CONF_EMAIL: "test@mail.com"}}
+    entry.data = {
+        CONF_EMAIL: "test@mail.com",
+        CONF_PASSWORD: "password123",
+        CONF_SENSOR_TYPE: SENSOR_TYPE_BUS,
+        CONF_STOP_ID: 72,
+        CONF_LINES: ["27"],
+    }
+    entities = []
+
+    from custom_components.emt_madrid.diagnostics import (
+        async_get_config_entry_diagnostics,
+    )
+    from custom_components.emt_madrid.sensor import async_setup_entry
+
+    await async_setup_entry(hass, entry, Mock(side_effect=entities.extend))
+    await hass.async_block_till_done()
+
+    api_sensor = entities[-1]
+    api_sensor._update_attributes()
+    assert api_sensor.entity_category == EntityCategory.DIAGNOSTIC
+    assert api_sensor.native_value is not None
+    attrs = api_sensor.extra_state_attributes
+    assert attrs[ATTR_REQUESTS] == 2
+    assert attrs[ATTR_RESPONSE_CODES] == {"00": 2}
+    assert attrs[ATTR_BYTES_RECEIVED] > 0
+    assert set(attrs[ATTR_PARSE_TIME]) == {"stop_info", "arrivals"}
+
+    diagnostics = await async_get_config_entry_diagnostics(hass, entry)
+    assert diagnostics["entry"]["data"][CONF_EMAIL] == "**REDACTED**"
+    account_endpoints = diagnostics["metrics"]["account"]["endpoints"]
+    assert account_endpoints["/v3/mobilitylabs/user/login/"]["requests"] == 1
+    assert (
+        account_endpoints["/v3/transport/busemtmad/stops/{id}/arrives/"]["requests"]
+        == 1
+    )
+
+
+@patch(
+    "custom_components.emt_madrid.emt_madrid.APIEMT._make_request",
+    side_effect=_make_request_mock,
+)
+async def test_bus_entry_diagnostics(
+    mock_request: Mock,
+    hass: HomeAssistant,
+) -> None:
+    """Test the diagnostics dump the client, cache, token and polling state."""
+    entry = Mock()
+    entry.options = {}
+    entry.entry_id = "test_bus_diagnostics"
+    entry.data = {
+        CONF_EMAIL: "test@mail.com",
+        CONF_PASSWORD: "password123",
+        CONF_SENSOR_TYPE: SENSOR_TYPE_BUS,
+        CONF_STOP_ID: 72,
+        CONF_LINES: ["27"],
+    }
+    entry.as_dict.return_value = {"data": dict(entry.data)}
+    entities = []
+
+    from custom_components.emt_madrid.diagnostics import (
+        async_get_config_entry_diagnostics,
+    )
+    from custom_components.emt_madrid.sensor import async_setup_entry
+
+    await async_setup_entry(hass, entry, Mock(side_effect=entities.extend))
+    await hass.async_block_till_done()
+    unsub = entities[0].coordinator.async_add_listener(lambda: None)
+
+    diagnostics = await async_get_config_entry_diagnostics(hass, entry)
+    unsub()
+
+    assert diagnostics["entry"]["data"][CONF_PASSWORD] == "**REDACTED**"
+    assert diagnostics["coordinator"]["last_update_success"] is True
+    assert diagnostics["coordinator"]["next_poll_in_seconds"] > 0
+    client = diagnostics["client"]
+    assert client["stop"]["bus_stop_name"] == "Cibeles-Casa de America"
+    assert client["arrivals"]["27"]["estimates"] == (233, 1556)
+    assert client["stop_cache"]["misses"] == 1
+    account = diagnostics["account"]
+    assert account["token_age_seconds"] is not None
+    assert account["quota"]["calls_today"] == 3
+    assert account["circuit_breakers"]["openapi.emtmadrid.es"]["open"] is False
+    assert account["request_cache"]["sent"] == 2
+
+
+@patch(
+    "custom_components.emt_madrid.emt_madrid.APIEMT._make_request",
+    side_effect=_make_request_mock,
+)
+async def test_closest_stops_service(
+    mock_request: Mock,
+    hass: HomeAssistant,
+) -> None:
+    """Test the closest stops are found in the cached catalogues."""
+    async_setup_services(hass)
+    with pytest.raises(HomeAssistantError):
+        await hass.services.async_call(
+            DOMAIN, SERVICE_CLOSEST_STOPS, {}, blocking=True, return_response=True
+        )
+
+    manager = async_get_token_manager(hass, "test@mail.com", "password123")
+    for _ in range(2):
+        response = await hass.services.async_call(
+            DOMAIN,
+            SERVICE_CLOSEST_STOPS,
+            {ATTR_LATITUDE: 40.416775, ATTR_LONGITUDE: -3.703790, "radius": 1500},
+            blocking=True,
+            return_response=True,
+        )
+    assert response == {
+        "stops": [
+            {
+                "stop_id": 3600,
+                "name": "Sol-Sevilla",
+                "lines": ["3/1", "51/1"],
+                "distance": 200,
+            },
+            {
+                "stop_id": 72,
+                "name": "Cibeles-Casa de America",
+                "lines": ["5/1", "14/1", "27/1"],
+                "distance": 1029,
+            },
+        ],
+        "stations": [
+            {
+                "station_id": 1001,
+                "number": "1001",
+                "name": "Sol",
+                "address": "Puerta del Sol 1",
+                "distance": 0,
+            },
+            {
+                "station_id": 2139,
+                "number": "2139",
+                "name": "Gran Via",
+                "address": "Calle Gran Via 1",
+                "distance": 477,
+            },
+        ],
+    }
+
+    list_requests = [
+        call for call in mock_request.call_args_list if call.args[0].endswith("/list/")
+    ]
+    assert len(list_requests) == 1
+    # Every call went through the one client of the account.
+    client = manager.get_client(async_get_clientsession(hass))
+    assert client.metrics.combined().requests == len(list_requests) + 1
+
+
+async def test_breaker_trial_with_invalid_json_settles(
+    hass: HomeAssistant,
+    aioclient_mock: AiohttpClientMocker,
+) -> None:
+    """Test a trial request answered with a non-JSON page reopens the breaker."""
+    url = "https://openapi.emtmadrid.es/v3/transport/bicimad/stations/"
+    aioclient_mock.get(url, text="<html>Maintenance</html>")
+    api = APIEMT(async_get_clientsession(hass), "test@mail.com", "password123")
+    breaker = CircuitBreaker()
+    for _ in range(FAILURE_THRESHOLD):
+        breaker.record_failure()
+    api._circuit_breakers["openapi.emtmadrid.es"] = breaker
+
+    with patch(
+        "custom_components.emt_madrid.breaker.time.monotonic",
+        return_value=time.monotonic() + MAX_BACKOFF,
+    ):
+        with pytest.raises(ValueError):
+            await api._async_request(url, method="GET")
+        assert breaker.is_open
+        assert breaker.as_dict()["consecutive_failures"] == FAILURE_THRESHOLD + 1
+
+    with patch(
+        "custom_components.emt_madrid.breaker.time.monotonic",
+        return_value=time.monotonic() + 10 * MAX_BACKOFF,
+    ):
+        assert breaker.allow_request()
+
+
+async def test_breaker_trial_cancelled_is_not_a_failure(hass: HomeAssistant) -> None:
+    """Test a cancelled trial request frees the breaker without counting a failure."""
+    url = "https://openapi.emtmadrid.es/v3/transport/bicimad/stations/"
+    api = APIEMT(async_get_clientsession(hass), "test@mail.com", "password123")
+    breaker = CircuitBreaker()
+    for _ in range(FAILURE_THRESHOLD):
+        breaker.record_failure()
+    api._circuit_breakers["openapi.emtmadrid.es"] = breaker
+
+    with patch(
+        "custom_components.emt_madrid.breaker.time.monotonic",
+        return_value=time.monotonic() + MAX_BACKOFF,
+    ), patch(
+        "custom_components.emt_madrid.emt_madrid.APIEMT._make_request",
+        side_effect=asyncio.CancelledError,
+    ):
+        with pytest.raises(asyncio.CancelledError):
+            await api._async_request(url, method="GET")
+        assert breaker.as_dict()["consecutive_failures"] == FAILURE_THRESHOLD
+        assert breaker.allow_request()
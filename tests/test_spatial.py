@@ -0,0 +1,66 @@
+"""Tests for the EMT Madrid spatial index."""
+
+import random
+
+import pytest
+
+from custom_components.emt_madrid.spatial import GridIndex, NeighbourTable, distance
+
+
+def test_distance_between_known_points() -> None:
+    """Test the distance between Sol and Cibeles, just under a kilometre apart."""
+    assert distance(40.416775, -3.70379, 40.419255, -3.692874) == pytest.approx(
+        963, abs=5
+    )
+
+
+def test_grid_index_matches_brute_force() -> None:
+    """Test radius and nearest lookups return the same as scanning every point."""
+    rng = random.Random(7)
+    points = [
+        (40.4168 + rng.uniform(-0.05, 0.05), -3.7038 + rng.uniform(-0.05, 0.05), i)
+        for i in range(2000)
+    ]
+    index = GridIndex(points)
+    assert len(index) == 2000
+
+    for _ in range(20):
+        lat = 40.4168 + rng.uniform(-0.06, 0.06)
+        lon = -3.7038 + rng.uniform(-0.06, 0.06)
+        by_distance = sorted(
+            (distance(lat, lon, p_lat, p_lon), value) for p_lat, p_lon, value in points
+        )
+
+        expected = [value for meters, value in by_distance if meters <= 600]
+        assert [value for _, value in index.within(lat, lon, 600)] == expected
+
+        assert [value for _, value in index.nearest(lat, lon, 5)] == [
+            value for _, value in by_distance[:5]
+        ]
+        assert [value for _, value in index.nearest(lat, lon, 50, radius=300)] == [
+            value for meters, value in by_distance[:50] if meters <= 300
+        ]
+
+
+def test_empty_grid_index() -> None:
+    """Test an index without points finds nothing."""
+    index = GridIndex([])
+    assert index.within(40.4, -3.7, 1000) == []
+    assert index.nearest(40.4, -3.7, 3) == []
+
+
+def test_neighbour_table() -> None:
+    """Test the neighbours of a point start with itself and skip far points."""
+    table = NeighbourTable(
+        {
+            "sol": (40.416775, -3.70379),
+            "cibeles": (40.419255, -3.692874),
+            "castilla": (40.4663, -3.6885),
+        },
+        count=5,
+        radius=2000,
+    )
+
+    assert [key for _, key in table.neighbours("sol")] == ["sol", "cibeles"]
+    assert table.neighbours("sol") is table.neighbours("sol")
+    assert table.neighbours("missing") == []